@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Analyse des axes d'activité en lot, pour réanalyser toute la liste de clients sans réponse immédiate
+#
+# Les requêtes de complétion de chaque site (mêmes paramètres qu'en temps réel, voir
+# web_extractor.build_business_axes_request) sont regroupées dans un fichier JSONL envoyé à l'API
+# batch du fournisseur; le lot est ensuite suivi jusqu'à sa fin et les réponses sont rattachées
+# à chaque site grâce à leur custom_id.
+#
+# Le transport est interchangeable: tout objet fournissant upload, create_batch, get_batch et
+# download convient. OpenAIBatchTransport s'appuie sur un client OpenAI/Azure OpenAI, qui peut
+# pointer vers un faux serveur batch local (base_url, voir tests/fake_batch_server.py); les tests
+# (tests/test_batch_analyzer.py) utilisent ce faux serveur et un faux transport en mémoire.
+
+BATCH_ENDPOINT = "/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+MAX_POLL_ERRORS = 10
+
+class OpenAIBatchTransport:
+    """
+    Transport de lots via l'API batch d'un client OpenAI ou Azure OpenAI
+    """
+
+    def __init__(self, client_factory):
+        self.client_factory = client_factory
+
+    def upload(self, path):
+        """
+        Envoie le fichier JSONL des requêtes et retourne son identifiant
+        """
+        with open(path, "rb") as f:
+            return self.client_factory().files.create(file=f, purpose="batch").id
+
+    def create_batch(self, input_file_id, endpoint=BATCH_ENDPOINT):
+        """
+        Crée le lot et retourne son identifiant
+        """
+        batch = self.client_factory().batches.create(
+            input_file_id=input_file_id,
+            endpoint=endpoint,
+            completion_window="24h"
+        )
+        return batch.id
+
+    def get_batch(self, batch_id):
+        """
+        Retourne l'état du lot: status, output_file_id, error_file_id et compteurs de requêtes
+        """
+        batch = self.client_factory().batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            'id': batch.id,
+            'status': batch.status,
+            'output_file_id': batch.output_file_id,
+            'error_file_id': batch.error_file_id,
+            'request_counts': {
+                'total': counts.total,
+                'completed': counts.completed,
+                'failed': counts.failed
+            } if counts else None
+        }
+
+    def download(self, file_id):
+        """
+        Retourne le contenu texte (JSONL) d'un fichier de résultats
+        """
+        return self.client_factory().files.content(file_id).text
+
+def read_sites(path):
+    """
+    Lit la liste des sites à analyser: une URL par ligne, lignes vides et commentaires (#) ignorés
+    Les URL sont normalisées et les doublons (« exemple.fr » et « https://exemple.fr/ ») supprimés
+    """
+    from url_resolver import dedup_urls
+
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return dedup_urls(line for line in lines if line and not line.startswith("#"))
+
+def resolve_sites(sites, max_workers=4):
+    """
+    Résout les redirections de chaque site en parallèle
+    Retourne un dictionnaire site -> URL finale
+    """
+    from url_resolver import resolve_url
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(sites, executor.map(resolve_url, sites)))
+
+def extract_contents(sites, max_workers=4):
+    """
+    Extrait le contenu de chaque site en parallèle (une session de profilage par site)
+    Retourne un dictionnaire site -> contenu
+    """
+    from web_extractor import extract_website_content
+    from profiling import site_session
+
+    def extract(site):
+        with site_session(site):
+            return extract_website_content(site)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, extract, site) for site in sites]
+        return {site: future.result() for site, future in zip(sites, futures)}
+
+def build_batch_requests(contents):
+    """
+    Construit les lignes du fichier JSONL (une requête par site dont le contenu est suffisant)
+    Retourne les requêtes, la correspondance custom_id -> site et les résultats des sites écartés
+    """
+    from web_extractor import build_business_axes_request
+
+    requests, sites_by_id, skipped = [], {}, {}
+    for position, (site, content) in enumerate(contents.items(), 1):
+        if not content or len(content) < 100:
+            skipped[site] = ["Échec de l'extraction du contenu suffisant"]
+            continue
+        custom_id = f"site-{position}"
+        sites_by_id[custom_id] = site
+        requests.append({
+            'custom_id': custom_id,
+            'method': "POST",
+            'url': BATCH_ENDPOINT,
+            'body': build_business_axes_request(content)
+        })
+    return requests, sites_by_id, skipped
+
+def write_batch_file(requests, work_dir="batches"):
+    """
+    Écrit le fichier JSONL des requêtes et retourne son chemin
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return path
+
+def wait_for_batch(transport, batch_id, poll_interval=30.0, timeout=24 * 3600, max_poll_errors=MAX_POLL_ERRORS):
+    """
+    Interroge l'état du lot jusqu'à ce qu'il soit terminé (ou que le délai soit dépassé)
+    Une erreur passagère de get_batch est réessayée à l'interrogation suivante; l'attente n'est
+    abandonnée qu'après max_poll_errors erreurs consécutives
+    """
+    deadline = time.monotonic() + timeout
+    status = None
+    errors = 0
+    while True:
+        try:
+            batch = transport.get_batch(batch_id)
+        except Exception as e:
+            errors += 1
+            print(f"Erreur lors de la vérification du lot {batch_id} ({errors}/{max_poll_errors}): {e}")
+            if errors >= max_poll_errors:
+                raise
+        else:
+            errors = 0
+            status = batch['status']
+            counts = batch.get('request_counts') or {}
+            print(f"Lot {batch_id}: {status} ({counts.get('completed', 0)}/{counts.get('total', '?')} requêtes traitées)")
+            if status in TERMINAL_STATUSES:
+                return batch
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Le lot {batch_id} n'est pas terminé après {timeout:.0f} s (statut: {status})")
+        time.sleep(poll_interval)
+
+def parse_batch_results(output_text, error_text, sites_by_id):
+    """
+    Rattache chaque réponse du lot à son site et en extrait les axes d'activité
+    Les requêtes en échec ou sans réponse reçoivent un message d'erreur, comme en temps réel
+    """
+    from web_extractor import parse_business_axes
+
+    results = {}
+    for line in (output_text or "").splitlines() + (error_text or "").splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            print(f"Ligne de résultat illisible ignorée: {e}")
+            continue
+        site = sites_by_id.get(record.get('custom_id'))
+        if site is None:
+            continue
+        response = record.get('response') or {}
+        try:
+            if record.get('error') or response.get('status_code') != 200:
+                raise RuntimeError(record.get('error') or response.get('body'))
+            results[site] = parse_business_axes(response['body']['choices'][0]['message']['content'])
+        except Exception as e:
+            print(f"Erreur lors de l'analyse des axes d'activité de {site}: {e}")
+            results[site] = [f"Erreur d'analyse: {str(e)}"]
+
+    for site in sites_by_id.values():
+        results.setdefault(site, ["Erreur d'analyse: aucune réponse dans le lot"])
+    return results
+
+def analyze_sites_in_batch(sites, transport, max_workers=4, poll_interval=30.0, timeout=24 * 3600, work_dir="batches"):
+    """
+    Identifie les axes d'activité de plusieurs sites avec une seule tâche batch
+    Les sites qui redirigent vers une même URL ne sont extraits et analysés qu'une fois
+    Retourne un dictionnaire site -> axes, dans l'ordre des sites
+    """
+    from url_resolver import dedup_urls
+
+    print(f"Résolution des redirections de {len(sites)} site(s)...")
+    targets = resolve_sites(sites, max_workers)
+    unique_targets = dedup_urls(targets.values())
+
+    print(f"Extraction du contenu de {len(unique_targets)} site(s)...")
+    contents = extract_contents(unique_targets, max_workers)
+
+    requests, sites_by_id, results = build_batch_requests(contents)
+    if requests:
+        path = write_batch_file(requests, work_dir)
+        print(f"{len(requests)} requête(s) écrite(s) dans {path}")
+
+        batch_id = transport.create_batch(transport.upload(path))
+        print(f"Lot {batch_id} soumis")
+        batch = wait_for_batch(transport, batch_id, poll_interval, timeout)
+
+        output_text = transport.download(batch['output_file_id']) if batch.get('output_file_id') else None
+        error_text = transport.download(batch['error_file_id']) if batch.get('error_file_id') else None
+        results.update(parse_batch_results(output_text, error_text, sites_by_id))
+
+    # Une URL invalide est retournée telle quelle par resolve_url puis écartée par dedup_urls
+    invalid = ["Erreur d'analyse: URL invalide"]
+    return {site: results.get(targets[site], invalid) for site in sites}
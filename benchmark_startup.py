@@ -0,0 +1,74 @@
+import sys
+import os
+import json
+import argparse
+import statistics
+import subprocess
+import time
+
+# Modules lents à importer qui ne doivent être chargés que par les étapes qui les utilisent
+HEAVY_MODULES = ["openai", "trafilatura", "bs4", "PIL", "numpy", "requests"]
+
+# Modules du projet importés par la CLI
+PROJECT_MODULES = [
+    "main", "web_extractor", "business_analyzer", "logo_extractor", "enhanced_image_generator", "html_to_markdown", "config_azure_openai",
+    "pipeline", "service", "batch_analyzer", "url_resolver", "storage", "recorder", "profiling", "circuit_breaker", "image_ranking", "models"
+]
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def time_command(command, runs):
+    """
+    Exécute une commande dans un processus Python neuf et retourne la liste des durées (en secondes)
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def find_eager_heavy_imports():
+    """
+    Importe tous les modules du projet et retourne les dépendances lourdes chargées au passage
+    """
+    code = (
+        "import sys, json\n"
+        f"for name in {PROJECT_MODULES!r}:\n"
+        "    __import__(name)\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure le temps de démarrage de la CLI et vérifie que les dépendances lourdes sont chargées à la demande")
+    parser.add_argument("--runs", type=int, default=10, help="Nombre d'exécutions par mesure")
+    parser.add_argument("--budget", type=float, default=0.5, help="Temps médian maximal autorisé en secondes")
+    args = parser.parse_args()
+
+    eager = find_eager_heavy_imports()
+    if eager:
+        print(f"Dépendances lourdes importées au chargement des modules: {', '.join(eager)}")
+    else:
+        print("Aucune dépendance lourde importée au chargement des modules")
+
+    benchmarks = {
+        "main.py --help": [sys.executable, "main.py", "--help"],
+        "import des modules": [sys.executable, "-c", "; ".join(f"import {name}" for name in PROJECT_MODULES)],
+    }
+
+    over_budget = False
+    for name, command in benchmarks.items():
+        durations = time_command(command, args.runs)
+        median = statistics.median(durations)
+        print(f"{name}: médiane {median * 1000:.0f} ms, min {min(durations) * 1000:.0f} ms, max {max(durations) * 1000:.0f} ms")
+        if median > args.budget:
+            over_budget = True
+            print(f"  -> dépasse le budget de {args.budget * 1000:.0f} ms")
+
+    if eager or over_budget:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import time
+import math
+import threading
+from collections import deque
+
+# Suivi de santé par endpoint avec disjoncteur (circuit breaker) et délai d'expiration adaptatif
+#
+# États du disjoncteur:
+#   closed     les requêtes passent normalement
+#   open       après `failure_threshold` échecs consécutifs: les requêtes sont refusées immédiatement
+#   half_open  après `recovery_timeout` secondes: une seule requête de test est autorisée;
+#              son succès referme le disjoncteur, son échec le rouvre
+#
+# Le délai d'expiration suit les latences observées: percentile `timeout_percentile` des dernières
+# réponses multiplié par `timeout_margin`, borné entre `min_timeout` et `max_timeout`
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class EndpointHealth:
+    """
+    État de santé d'un endpoint: latences récentes, échecs consécutifs et état du disjoncteur
+    """
+
+    def __init__(self, name, failure_threshold=3, recovery_timeout=60.0, min_timeout=5.0, max_timeout=30.0,
+                 timeout_percentile=95, timeout_margin=2.0, window=50, min_samples=5):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_percentile = timeout_percentile
+        self.timeout_margin = timeout_margin
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.total_successes = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+    def _recovery_elapsed(self):
+        return self.opened_at is not None and time.monotonic() - self.opened_at >= self.recovery_timeout
+
+    def is_available(self):
+        """
+        Indique si une requête serait autorisée, sans réserver la requête de test en half_open
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return self._recovery_elapsed()
+            return not self.probe_in_flight
+
+    def allow_request(self):
+        """
+        Autorise ou refuse une requête; en half_open, une seule requête de test passe à la fois
+        """
+        with self.lock:
+            if self.state == OPEN and self._recovery_elapsed():
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.total_rejected += 1
+            return False
+
+    def record_success(self, latency=None):
+        """
+        Enregistre une réponse de l'endpoint et referme le disjoncteur
+        Sans latency (réponse d'erreur côté client, 4xx), l'endpoint est joignable mais la latence
+        n'est pas retenue pour le délai adaptatif
+        """
+        with self.lock:
+            if latency is not None:
+                self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.total_successes += 1
+            self.probe_in_flight = False
+            if self.state != CLOSED:
+                print(f"Endpoint {self.name} rétabli: disjoncteur refermé")
+            self.state = CLOSED
+            self.opened_at = None
+
+    def record_failure(self):
+        """
+        Enregistre un échec (délai expiré, connexion impossible, erreur 5xx) et ouvre le disjoncteur si nécessaire
+        Seules les réponses réussies alimentent les latences: un délai expiré ne doit pas allonger le suivant
+        """
+        with self.lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self.probe_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"Endpoint {self.name} indisponible après {self.consecutive_failures} échec(s): disjoncteur ouvert pour {self.recovery_timeout:.0f} s")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def cancel_request(self):
+        """
+        Termine une requête sans verdict sur la santé de l'endpoint (erreur locale, cassette absente):
+        la requête de test éventuelle est libérée, l'état du disjoncteur est inchangé
+        """
+        with self.lock:
+            self.probe_in_flight = False
+
+    def latency_percentile(self, percentile):
+        """
+        Percentile (méthode du rang le plus proche) des latences récentes, ou None sans mesure
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        rank = max(1, math.ceil(percentile / 100 * len(latencies)))
+        return latencies[rank - 1]
+
+    def current_timeout(self):
+        """
+        Délai d'expiration adaptatif; max_timeout tant que les mesures sont insuffisantes
+        """
+        if len(self.latencies) < self.min_samples:
+            return self.max_timeout
+        observed = self.latency_percentile(self.timeout_percentile) * self.timeout_margin
+        return min(self.max_timeout, max(self.min_timeout, observed))
+
+    def snapshot(self):
+        """
+        Retourne l'état de santé sous forme de dictionnaire sérialisable
+        """
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            'name': self.name,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'successes': self.total_successes,
+            'failures': self.total_failures,
+            'rejected': self.total_rejected,
+            'latency_p50': round(p50, 3) if p50 is not None else None,
+            'latency_p95': round(p95, 3) if p95 is not None else None,
+            'timeout': round(self.current_timeout(), 3)
+        }
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def get_endpoint_health(name, **options):
+    """
+    Retourne le suivi de santé partagé d'un endpoint, créé au premier appel avec les options données
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = EndpointHealth(name, **options)
+        return _registry[name]
+
+def health_snapshot():
+    """
+    État de santé de tous les endpoints suivis
+    """
+    with _registry_lock:
+        endpoints = list(_registry.values())
+    return [endpoint.snapshot() for endpoint in endpoints]
@@ -1,11 +1,21 @@
 from dotenv import load_dotenv
 import os
-from openai import AzureOpenAI
+
+# Client partagé: créé une seule fois par processus puis réutilisé (mode service notamment)
+_azure_client = None
 
 def init_azure_openai():
     """
     Initialise et configure le client Azure OpenAI
+    Le client est mis en cache et réutilisé lors des appels suivants
     """
+    global _azure_client
+    if _azure_client is not None:
+        return _azure_client
+
+    # Import différé: le SDK openai est lent à importer
+    from openai import AzureOpenAI
+
     load_dotenv()
     
     # Configuration pour Azure OpenAI
@@ -18,13 +28,13 @@ def init_azure_openai():
         raise ValueError("Les variables d'environnement AZURE_OPENAI_API_KEY et AZURE_OPENAI_ENDPOINT doivent être définies")
     
     # Création du client Azure OpenAI
-    client = AzureOpenAI(
+    _azure_client = AzureOpenAI(
         api_key=api_key,
         api_version=api_version,
         azure_endpoint=azure_endpoint
     )
     
-    return client
+    return _azure_client
 
 def get_deployment_info():
     """
@@ -1,123 +1,204 @@
-from PIL import Image, ImageDraw, ImageFont
-import requests
 from io import BytesIO
 import os
 import base64
-from datetime import datetime
-import uuid
-from openai import OpenAI
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from recorder import image_generation
+from profiling import profile_stage, profiled_stage
+from storage import get_store
+
+# Qualités gpt-image-1: les ébauches sont rendues en basse qualité (rapides et peu coûteuses),
+# seules les ébauches retenues sont ensuite rendues en haute qualité
+DRAFT_QUALITY = "low"
+FINAL_QUALITY = "high"
+
+# Réutilisé d'une image à l'autre au lieu de recréer le client à chaque génération
+_openai_client = None
 
 def init_openai_client():
     """
     Initialise et retourne le client OpenAI
+    Le client est créé au premier appel puis conservé pour tout le processus
     """
+    global _openai_client
+    if _openai_client is not None:
+        return _openai_client
+
+    # Import différé: le SDK openai est lent à importer
+    from openai import OpenAI
+
     load_dotenv()
     api_key = os.getenv("OPENAI_API_KEY")
     
     if not api_key:
         raise ValueError("La variable d'environnement OPENAI_API_KEY doit être définie")
     
-    return OpenAI(api_key=api_key)
+    _openai_client = OpenAI(api_key=api_key)
+    return _openai_client
 
-def generate_image_with_assets(prompt, logo_path=None, colors=None, output_folder="images"):
+@profiled_stage("compositing")
+def composite_logo(image_data, logo_path):
+    """
+    Intègre le logo en haut à gauche de l'image générée
+    Retourne l'image finale encodée en PNG
+    """
+    from PIL import Image
+
+    # Ouvrir l'image générée et le logo
+    base_image = Image.open(BytesIO(image_data))
+    logo = Image.open(logo_path)
+    
+    # Redimensionner le logo pour qu'il ne dépasse pas 20% de la largeur de l'image
+    max_logo_width = int(base_image.width * 0.2)
+    logo_ratio = logo.width / logo.height
+    new_logo_width = min(max_logo_width, logo.width)
+    new_logo_height = int(new_logo_width / logo_ratio)
+    logo = logo.resize((new_logo_width, new_logo_height), Image.LANCZOS)
+    
+    # Calculer la position du logo (haut gauche avec une marge)
+    position = (20, 20)
+    
+    # Créer un masque pour le logo si nécessaire (si le logo a un canal alpha)
+    if logo.mode == 'RGBA':
+        logo_mask = logo.split()[3]  # Canal alpha
+    else:
+        logo_mask = None
+    
+    # Coller le logo sur l'image de base
+    base_image.paste(logo, position, logo_mask)
+    
+    # Encoder l'image finale
+    output = BytesIO()
+    base_image.save(output, format="PNG")
+    return output.getvalue()
+
+def generate_image_with_assets(prompt, logo_path=None, colors=None, output_folder="images", quality=FINAL_QUALITY, size="1024x1024", site=None, axis=None):
     """
     Génère une publicité à partir d'un prompt en utilisant OpenAI gpt-image-1
     puis intègre le logo de l'entreprise
+    quality=DRAFT_QUALITY produit une ébauche rapide, composée avec le logo de la même façon
+    L'image est enregistrée dans le stockage adressé par contenu de output_folder et indexée
+    avec le site, l'axe, le prompt et la qualité
     """
     print(f"Génération de la publicité pour le prompt: {prompt[:50]}...")
     
-    # Initialiser le client OpenAI
-    client = init_openai_client()
-    
     try:
-        # Générer publicité de base
-        img_response = client.images.generate(
-            model="gpt-image-1",
-            prompt=prompt,
-            background="auto",
-            n=1,
-            quality="high",
-            size="1024x1024",
-            output_format="png",
-            moderation="auto",
-        )
-        
-        # Créer le dossier de sortie s'il n'existe pas
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
+        # Générer publicité de base (le client OpenAI n'est initialisé que si l'appel n'est pas rejoué)
+        with profile_stage("generation"):
+            image_b64 = image_generation(
+                init_openai_client,
+                model="gpt-image-1",
+                prompt=prompt,
+                background="auto",
+                n=1,
+                quality=quality,
+                size=size,
+                output_format="png",
+                moderation="auto",
+            )
         
-        # Générer un nom de fichier unique
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        base_filename = f"{output_folder}/image_{timestamp}_{unique_id}"
-        raw_image_filename = f"{base_filename}_raw.png"
-        final_filename = f"{base_filename}.png"
-        
-        # Sauvegarder l'image brute
-        image_data = base64.b64decode(img_response.data[0].b64_json)
-        with open(raw_image_filename, "wb") as f:
-            f.write(image_data)
+        image_data = base64.b64decode(image_b64)
+        store = get_store(output_folder)
+        metadata = {'site': site, 'axis': axis, 'prompt': prompt, 'quality': quality}
         
         # Si un logo est disponible, l'intégrer à l'image
         if logo_path and os.path.exists(logo_path):
             try:
-                # Ouvrir l'image générée et le logo
-                base_image = Image.open(BytesIO(image_data))
-                logo = Image.open(logo_path)
-                
-                # Redimensionner le logo pour qu'il ne dépasse pas 20% de la largeur de l'image
-                max_logo_width = int(base_image.width * 0.2)
-                logo_ratio = logo.width / logo.height
-                new_logo_width = min(max_logo_width, logo.width)
-                new_logo_height = int(new_logo_width / logo_ratio)
-                logo = logo.resize((new_logo_width, new_logo_height), Image.LANCZOS)
-                
-                # Calculer la position du logo (haut gauche avec une marge)
-                position = (20, 20)
-                
-                # Créer un masque pour le logo si nécessaire (si le logo a un canal alpha)
-                if logo.mode == 'RGBA':
-                    logo_mask = logo.split()[3]  # Canal alpha
-                else:
-                    logo_mask = None
-                
-                # Coller le logo sur l'image de base
-                base_image.paste(logo, position, logo_mask)
-                
-                # Sauvegarder l'image finale
-                base_image.save(final_filename)
-                
+                final_filename = store.put(composite_logo(image_data, logo_path), "image", **metadata)
                 print(f"Image avec logo sauvegardée: {final_filename}")
                 return final_filename
             except Exception as e:
                 print(f"Erreur lors de l'ajout du logo: {e}")
-                print(f"Utilisation de l'image brute: {raw_image_filename}")
-                return raw_image_filename
-        else:
-            # Si pas de logo, utiliser l'image brute
-            os.rename(raw_image_filename, final_filename)
-            print(f"Image sauvegardée: {final_filename}")
-            return final_filename
+                print("Utilisation de l'image brute")
+        
+        # Sans logo (ou si son intégration a échoué), conserver l'image brute
+        final_filename = store.put(image_data, "image", **metadata)
+        print(f"Image sauvegardée: {final_filename}")
+        return final_filename
     
     except Exception as e:
         print(f"Erreur lors de la génération de la publicité: {e}")
         return None
 
-def generate_multiple_images_with_assets(prompts, visual_identity, output_folder="images"):
+def _get_logo_and_colors(visual_identity):
+    """
+    Retourne le chemin du logo et la palette de couleurs d'une identité visuelle
+    """
+    return visual_identity.logo_path, visual_identity.colors or None
+
+def iter_images_with_assets(prompts, visual_identity, output_folder="images", axes=None, max_workers=4, quality=FINAL_QUALITY, indexes=None, site=None):
+    """
+    Génère plusieurs publicités en parallèle et les retourne une par une, dès qu'elles sont prêtes
+    Chaque élément est un dictionnaire: index (à partir de 1, ou pris dans indexes), axis, prompt, quality,
+    path (None en cas d'échec), elapsed (durée de la génération) et since_start (délai depuis le lancement du lot), en secondes
+    """
+    if not prompts:
+        return
+
+    logo_path, colors = _get_logo_and_colors(visual_identity)
+    start = time.perf_counter()
+
+    def generate(prompt, axis):
+        generation_start = time.perf_counter()
+        file_path = generate_image_with_assets(prompt, logo_path, colors, output_folder, quality, site=site, axis=axis)
+        return file_path, time.perf_counter() - generation_start
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts))))
+    futures = {}
+    try:
+        for position, prompt in enumerate(prompts, 1):
+            print(f"\nGénération d'image {position}/{len(prompts)} ({quality})")
+            # Chaque tâche reçoit une copie du contexte (session de profilage du site notamment)
+            axis = axes[position - 1] if axes and position <= len(axes) else None
+            futures[executor.submit(contextvars.copy_context().run, generate, prompt, axis)] = position
+
+        for future in as_completed(futures):
+            position = futures[future]
+            file_path, elapsed = future.result()
+            yield {
+                'index': indexes[position - 1] if indexes else position,
+                'axis': axes[position - 1] if axes and position <= len(axes) else None,
+                'prompt': prompts[position - 1],
+                'quality': quality,
+                'path': file_path,
+                'elapsed': round(elapsed, 3),
+                'since_start': round(time.perf_counter() - start, 3)
+            }
+    finally:
+        # Si le consommateur s'arrête en cours de route, ne pas lancer les générations restantes
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+def generate_multiple_images_with_assets(prompts, visual_identity, output_folder="images", max_workers=4):
     """
     Génère plusieurs publicités à partir d'une liste de prompts
     en intégrant les éléments d'identité visuelle
+    Retourne les fichiers générés dans l'ordre des prompts
     """
-    generated_files = []
-    
-    logo_path = visual_identity["logo"]["path"] if visual_identity["logo"] else None
-    colors = visual_identity["colors"] if visual_identity["colors"] else None
-    
-    for i, prompt in enumerate(prompts, 1):
-        print(f"\nGénération d'image {i}/{len(prompts)}")
-        file_path = generate_image_with_assets(prompt, logo_path, colors, output_folder)
-        if file_path:
-            generated_files.append(file_path)
-    
-    return generated_files
\ No newline at end of file
+    results = sorted(iter_images_with_assets(prompts, visual_identity, output_folder, max_workers=max_workers), key=lambda result: result['index'])
+    return [result['path'] for result in results if result['path']]
+
+def iter_drafts_with_assets(prompts, visual_identity, output_folder="images", axes=None, max_workers=4, site=None):
+    """
+    Génère une ébauche basse qualité pour chaque prompt (voir iter_images_with_assets)
+    """
+    return iter_images_with_assets(prompts, visual_identity, output_folder, axes, max_workers, DRAFT_QUALITY, site=site)
+
+def iter_final_images(drafts, visual_identity, output_folder="images", max_workers=4, site=None):
+    """
+    Rend en haute qualité les ébauches retenues, en conservant leur index et leur axe
+    """
+    drafts = [draft for draft in drafts if draft['path']]
+    return iter_images_with_assets(
+        [draft['prompt'] for draft in drafts],
+        visual_identity,
+        output_folder,
+        [draft['axis'] for draft in drafts],
+        max_workers,
+        FINAL_QUALITY,
+        [draft['index'] for draft in drafts],
+        site
+    )
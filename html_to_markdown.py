@@ -1,22 +1,39 @@
 from dotenv import load_dotenv
 import os
-import requests
+import time
 from typing import Optional
+from recorder import http_post, get_mode
+from circuit_breaker import get_endpoint_health
+
+MARKDOWN_API_URL = "https://markdown.innovation-additi.fr/api/html-to-markdown"
+
+# Santé de l'API partagée par tous les sites d'un même processus: après 3 échecs consécutifs (délai
+# expiré, connexion impossible ou erreur 5xx; une erreur 4xx propre à un site ne compte pas), l'API
+# n'est plus appelée pendant 60 s et le délai d'expiration (30 s au plus) suit les latences observées
+_api_health = get_endpoint_health(MARKDOWN_API_URL, failure_threshold=3, recovery_timeout=60.0, min_timeout=5.0, max_timeout=30.0)
 
 def init_html_to_markdown_api():
     """
     Initialise la configuration pour l'API de conversion HTML vers Markdown
+    Retourne None si le token n'est pas défini: l'étape de conversion est alors ignorée
     """
     load_dotenv()
-    
+
     # Récupérer le token API depuis les variables d'environnement
     api_token = os.getenv("HTML_TO_MARKDOWN_API_TOKEN")
-    
+
     if not api_token:
-        raise ValueError("La variable d'environnement HTML_TO_MARKDOWN_API_TOKEN doit être définie")
-    
+        print("La variable d'environnement HTML_TO_MARKDOWN_API_TOKEN n'est pas définie: conversion Markdown ignorée")
+        return None
+
     return api_token
 
+def markdown_api_available() -> bool:
+    """
+    Indique si l'API peut être appelée (disjoncteur fermé ou prêt pour une requête de test)
+    """
+    return _api_health.is_available()
+
 def convert_html_to_markdown(url: str) -> Optional[str]:
     """
     Convertit le contenu d'une URL en Markdown en utilisant l'API
@@ -25,13 +42,20 @@ def convert_html_to_markdown(url: str) -> Optional[str]:
         url (str): L'URL à convertir
 
     Returns:
-        Optional[str]: Le contenu converti en Markdown ou None en cas d'erreur
+        Optional[str]: Le contenu converti en Markdown ou None en cas d'erreur,
+        d'absence de token ou si le disjoncteur de l'API est ouvert
     """
     api_token = init_html_to_markdown_api()
+    # En rejeu, les cassettes suffisent: le token n'est pas nécessaire
+    if not api_token and get_mode() != "replay":
+        return None
 
-    try:
-        api_url = "https://markdown.innovation-additi.fr/api/html-to-markdown"
+    if not _api_health.allow_request():
+        print("API HTML vers Markdown indisponible (disjoncteur ouvert), conversion ignorée")
+        return None
 
+    start = time.perf_counter()
+    try:
         headers = {
             "Authorization": f"Bearer {api_token}",
             "Content-Type": "application/json"
@@ -41,11 +65,13 @@ def convert_html_to_markdown(url: str) -> Optional[str]:
             "url": url
         }
 
-        print("Envoi de la requête à l'API avec l'URL:", url)
-        response = requests.post(api_url, json=payload, headers=headers, timeout=30)
+        timeout = _api_health.current_timeout()
+        print(f"Envoi de la requête à l'API avec l'URL: {url} (délai: {timeout:.1f} s)")
+        response = http_post(MARKDOWN_API_URL, json=payload, headers=headers, timeout=timeout)
         response.raise_for_status()
 
         result = response.json()
+        _api_health.record_success(time.perf_counter() - start)
 
         if "content" in result:
             print("Conversion en Markdown réussie")
@@ -55,6 +81,22 @@ def convert_html_to_markdown(url: str) -> Optional[str]:
             return None
 
     except Exception as e:
+        _record_error(e)
         print(f"Erreur lors de la conversion de l'URL: {e}")
         return None
 
+def _record_error(error):
+    """
+    Reporte une erreur d'appel sur la santé de l'API
+    Seuls un délai expiré, une connexion impossible ou une erreur 5xx comptent comme des échecs de l'API;
+    une erreur 4xx (jeton refusé, site du client injoignable) montre au contraire qu'elle répond
+    """
+    import requests
+
+    response = getattr(error, "response", None)
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)) or (response is not None and response.status_code >= 500):
+        _api_health.record_failure()
+    elif response is not None:
+        _api_health.record_success()
+    else:
+        _api_health.cancel_request()
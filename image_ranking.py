@@ -0,0 +1,125 @@
+import contextvars
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from models import ImageCandidate
+from recorder import http_get
+from profiling import profiled_stage
+
+# Classement des images principales d'un site
+#
+# Chaque candidate est décodée en vignette (mode draft de PIL: un JPEG est décodé directement à
+# échelle réduite, sans reconstruire l'image complète) en relevant ses dimensions réelles.
+# Sont écartées:
+#   - les URI data: (pixels transparents ou flous des images chargées à la demande)
+#   - les images trop petites ou uniformes (espaces réservés)
+#   - les quasi-doublons (images d'un carrousel, même visuel à plusieurs tailles): empreintes dHash
+#     à moins de DUPLICATE_DISTANCE bits d'écart; seule la plus grande est conservée
+# Les images restantes sont classées par résolution réelle décroissante.
+#
+# numpy et PIL sont importés dans les fonctions pour ne pas ralentir le démarrage de la CLI.
+
+HASH_SIZE = 8
+DUPLICATE_DISTANCE = 10
+MIN_WIDTH = 300
+MIN_HEIGHT = 200
+MIN_CONTRAST = 2.0
+PREVIEW_SIZE = 32
+# Les images plus lourdes sont écartées sans être téléchargées en entier
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+
+def decode_thumbnail(data):
+    """
+    Décode une image en aperçu PREVIEW_SIZE x PREVIEW_SIZE niveaux de gris puis en vignette de
+    (HASH_SIZE + 1) x HASH_SIZE pour l'empreinte
+    Retourne les dimensions réelles de l'image, le contraste (écart type) de l'aperçu et la vignette (tableau numpy)
+    """
+    import numpy as np
+    from PIL import Image
+
+    image = Image.open(BytesIO(data))
+    width, height = image.size
+    # Sans effet pour les formats autres que JPEG
+    image.draft("L", (PREVIEW_SIZE, PREVIEW_SIZE))
+    preview = image.convert("L").resize((PREVIEW_SIZE, PREVIEW_SIZE), Image.BILINEAR)
+    thumbnail = preview.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    contrast = float(np.asarray(preview, dtype=np.float32).std())
+    return width, height, contrast, np.asarray(thumbnail, dtype=np.float32)
+
+def dhash_bits(thumbnails):
+    """
+    Empreintes dHash d'un lot de vignettes (n, HASH_SIZE, HASH_SIZE + 1): un bit par pixel,
+    vrai si son voisin de droite est plus clair que lui
+    Retourne un tableau booléen (n, HASH_SIZE * HASH_SIZE)
+    """
+    import numpy as np
+
+    stack = np.asarray(thumbnails, dtype=np.float32)
+    return (stack[:, :, 1:] > stack[:, :, :-1]).reshape(len(stack), -1)
+
+def hamming_distances(bits):
+    """
+    Matrice des distances de Hamming entre toutes les paires d'empreintes
+    """
+    return (bits[:, None, :] != bits[None, :, :]).sum(axis=2)
+
+def _bits_to_int(bits):
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+def _fetch(src):
+    """
+    Télécharge (MAX_IMAGE_BYTES au plus) et décode une image candidate; retourne None en cas d'échec
+    """
+    try:
+        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+        response = http_get(src, max_bytes=MAX_IMAGE_BYTES, headers=headers, timeout=20)
+        response.raise_for_status()
+        return decode_thumbnail(response.content)
+    except Exception as e:
+        print(f"Image ignorée ({src}): {e}")
+        return None
+
+@profiled_stage("image_ranking")
+def rank_images(sources, max_images=5, max_workers=8):
+    """
+    Télécharge les images candidates, écarte les espaces réservés et les quasi-doublons
+    Retourne les max_images meilleures (ImageCandidate), de la plus grande à la plus petite
+    """
+    import numpy as np
+
+    sources = [src for src in dict.fromkeys(sources) if not src.startswith('data:')]
+    if not sources or max_images <= 0:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, _fetch, src) for src in sources]
+        decoded = [future.result() for future in futures]
+
+    kept = []
+    for src, result in zip(sources, decoded):
+        if result is None:
+            continue
+        width, height, contrast, thumbnail = result
+        # Espaces réservés: trop petits ou d'une seule couleur
+        if width <= MIN_WIDTH and height <= MIN_HEIGHT:
+            continue
+        if contrast < MIN_CONTRAST:
+            continue
+        kept.append((src, width, height, thumbnail))
+
+    if not kept:
+        return []
+
+    # Classer par résolution réelle puis conserver la plus grande image de chaque groupe de quasi-doublons
+    kept.sort(key=lambda item: item[1] * item[2], reverse=True)
+    bits = dhash_bits([item[3] for item in kept])
+    distances = hamming_distances(bits)
+
+    selected = []
+    for position in range(len(kept)):
+        if len(selected) >= max_images:
+            break
+        if selected and np.min(distances[position, selected]) < DUPLICATE_DISTANCE:
+            continue
+        selected.append(position)
+
+    return [ImageCandidate(kept[position][0], kept[position][1], kept[position][2], _bits_to_int(bits[position])) for position in selected]
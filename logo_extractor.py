@@ -1,25 +1,57 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 import urllib.parse
-import base64
-from io import BytesIO
-from PIL import Image
-import os
+from models import LogoCandidate, LogoInfo
+from recorder import http_get
+from profiling import profiled_stage
+from storage import get_store
+from image_ranking import rank_images
 
+# bs4 est importé dans chaque fonction pour ne pas ralentir
+# le démarrage des commandes qui n'ont pas besoin de l'identité visuelle
+
+def _page_base_url(response, soup):
+    """
+    URL de référence pour résoudre les liens relatifs d'une page: l'URL finale après redirections
+    (et non l'URL demandée), ou la balise <base href> si la page en déclare une
+    """
+    base = soup.find('base', href=True)
+    if base:
+        return urllib.parse.urljoin(response.url, base['href'])
+    return response.url
+
+def _make_candidate(tag, score, source, is_favicon=False):
+    """
+    Copie les attributs utiles d'une balise <img> (ou <link> pour un favicon) dans un LogoCandidate
+    La balise elle-même n'est pas conservée afin que l'arbre HTML puisse être libéré
+    """
+    return LogoCandidate(
+        src=tag.get('href') if is_favicon else tag.get('src'),
+        alt=tag.get('alt'),
+        width=tag.get('width'),
+        height=tag.get('height'),
+        score=score,
+        source=source,
+        is_favicon=is_favicon
+    )
+
+@profiled_stage("logo_scoring")
 def extract_logo(url):
     """
     Extrait le logo principal d'un site web en utilisant plusieurs méthodes
-    Retourne un dictionnaire avec les informations du logo ou None si aucun logo n'est trouvé
+    Retourne un LogoInfo avec les informations du logo ou None si aucun logo n'est trouvé
     """
+    soup = None
     try:
+        from bs4 import BeautifulSoup
+
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=20)
+        response = http_get(url, headers=headers, timeout=20)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
+        base_url = _page_base_url(response, soup)
         
         # Extraire le domaine pour des comparaisons plus tard
-        domain_parts = urllib.parse.urlparse(url).netloc.split('.')
+        domain_parts = urllib.parse.urlparse(base_url).netloc.split('.')
         domain = domain_parts[-2] if len(domain_parts) >= 2 else domain_parts[0]
         
         # Méthode 1: Priorité aux logos explicitement marqués
@@ -30,20 +62,12 @@ def extract_logo(url):
             # Chercher une image à l'intérieur
             logo_img = element.find('img')
             if logo_img and logo_img.get('src'):
-                logo_candidates.append({
-                    'img': logo_img,
-                    'score': 100,  # Score très élevé pour les logos explicites
-                    'source': 'explicit_logo_class'
-                })
+                logo_candidates.append(_make_candidate(logo_img, 100, 'explicit_logo_class'))  # Score très élevé pour les logos explicites
             # Si pas d'image, regarder si c'est un lien avec une image
             elif element.name == 'a' and element.find('img'):
                 logo_img = element.find('img')
                 if logo_img and logo_img.get('src'):
-                    logo_candidates.append({
-                        'img': logo_img,
-                        'score': 90,
-                        'source': 'logo_link_img'
-                    })
+                    logo_candidates.append(_make_candidate(logo_img, 90, 'logo_link_img'))
         
         # 1.2 Rechercher les images avec logo dans les attributs ou le chemin
         logo_patterns = [r'logo', r'brand', r'header-image', r'site-logo', r'main-logo']
@@ -78,11 +102,7 @@ def extract_logo(url):
             
             # Si un score a été attribué, ajouter aux candidats
             if score > 0:
-                logo_candidates.append({
-                    'img': img,
-                    'score': score,
-                    'source': source
-                })
+                logo_candidates.append(_make_candidate(img, score, source))
         
         # Méthode 2: Emplacement stratégique - les logos sont généralement en haut de page
         # 2.1 Logo dans l'en-tête
@@ -93,11 +113,7 @@ def extract_logo(url):
             for logo_element in logo_elements:
                 logo_img = logo_element.find('img')
                 if logo_img and logo_img.get('src'):
-                    logo_candidates.append({
-                        'img': logo_img,
-                        'score': 85,
-                        'source': 'header_logo_element'
-                    })
+                    logo_candidates.append(_make_candidate(logo_img, 85, 'header_logo_element'))
             
             # Sinon chercher toutes les images dans l'en-tête, mais avec un score plus faible
             if not logo_elements:
@@ -119,11 +135,7 @@ def extract_logo(url):
                                 pass
                         
                         if not is_small_icon:
-                            logo_candidates.append({
-                                'img': img,
-                                'score': score,
-                                'source': 'header_img'
-                            })
+                            logo_candidates.append(_make_candidate(img, score, 'header_img'))
         
         # 2.2 Logo dans la barre de navigation
         navbar_elements = soup.select('nav, .navbar, .nav, #navbar, #nav')
@@ -138,138 +150,128 @@ def extract_logo(url):
                         if href == '/' or href == '#' or href == url or href.endswith('index.html'):
                             score += 20
                     
-                    logo_candidates.append({
-                        'img': img,
-                        'score': score,
-                        'source': 'navbar_img'
-                    })
+                    logo_candidates.append(_make_candidate(img, score, 'navbar_img'))
         
         # 2.3 Première image visible en haut de page (souvent le logo)
         top_images = soup.select('body > img, body > div > img, body > header > img, body > div > header > img')
         if top_images:
-            logo_candidates.append({
-                'img': top_images[0],
-                'score': 25,
-                'source': 'top_image'
-            })
+            logo_candidates.append(_make_candidate(top_images[0], 25, 'top_image'))
             
         # Méthode 3: Contenu de l'image
-        for candidate in list(logo_candidates):  # Copie de la liste pour pouvoir modifier
-            img = candidate['img']
-            img_alt = img.get('alt', '').lower()
-            img_src = img.get('src', '').lower()
+        for candidate in logo_candidates:
+            img_alt = (candidate.alt or '').lower()
+            img_src = (candidate.src or '').lower()
             
             # Bonus si l'image contient le nom du domaine
             if domain.lower() in img_alt or domain.lower() in img_src:
-                candidate['score'] += 15
-                candidate['source'] += '_with_domain'
+                candidate.score += 15
+                candidate.source += '_with_domain'
             
             # Pénalité pour les images qui sont probablement des bannières ou des produits
             if 'banner' in img_src or 'banner' in img_alt:
-                candidate['score'] -= 30
+                candidate.score -= 30
             if 'product' in img_src or 'product' in img_alt:
-                candidate['score'] -= 25
+                candidate.score -= 25
             if 'slider' in img_src or 'slider' in img_alt:
-                candidate['score'] -= 20
+                candidate.score -= 20
             
             # Vérifier les dimensions pour éviter les bannières et favoriser les logos typiques
-            if img.get('width') and img.get('height'):
+            if candidate.width and candidate.height:
                 try:
-                    width = int(img['width'])
-                    height = int(img['height'])
+                    width = int(candidate.width)
+                    height = int(candidate.height)
                     
                     # Logos typiques: proportionnés et de taille moyenne
                     if 30 <= width <= 300 and 30 <= height <= 150:
-                        candidate['score'] += 15
+                        candidate.score += 15
                     elif width > 500 or height > 300:
-                        candidate['score'] -= 25  # Probablement une bannière
-                    elif (width < 20 or height < 20) and 'icon' not in candidate['source']:
-                        candidate['score'] -= 15  # Probablement une icône de navigation
+                        candidate.score -= 25  # Probablement une bannière
+                    elif (width < 20 or height < 20) and 'icon' not in candidate.source:
+                        candidate.score -= 15  # Probablement une icône de navigation
                     
                     # Les logos ont souvent un ratio largeur/hauteur entre 1:1 et 4:1
                     if width > 0 and height > 0:
                         ratio = width / height
                         if 0.8 <= ratio <= 4.0:
-                            candidate['score'] += 10
+                            candidate.score += 10
                         elif ratio > 6.0:  # Très allongé, probablement une bannière
-                            candidate['score'] -= 15
+                            candidate.score -= 15
                 except ValueError:
                     pass
         
         # Méthode 4: Support des favicons ou logos dans les métadonnées comme dernier recours
         meta_logo = soup.select_one('link[rel*="icon"], link[rel="apple-touch-icon"]')
         if meta_logo and meta_logo.get('href'):
-            logo_candidates.append({
-                'img': meta_logo,
-                'score': 5,  # Score faible car c'est un dernier recours
-                'source': 'favicon',
-                'is_favicon': True
-            })
+            logo_candidates.append(_make_candidate(meta_logo, 5, 'favicon', is_favicon=True))  # Score faible car c'est un dernier recours
         
         # Si des candidats ont été trouvés, sélectionner le meilleur
         if logo_candidates:
             # Trier par score décroissant
-            sorted_candidates = sorted(logo_candidates, key=lambda x: x['score'], reverse=True)
+            sorted_candidates = sorted(logo_candidates, key=lambda x: x.score, reverse=True)
             
             # Prendre le meilleur candidat
             best_candidate = sorted_candidates[0]
             
             # Traiter le cas spécial des favicons
-            if best_candidate.get('is_favicon'):
-                href = best_candidate['img'].get('href')
+            if best_candidate.is_favicon:
+                href = best_candidate.src
                 if not href.startswith(('http://', 'https://')):
-                    href = urllib.parse.urljoin(url, href)
-                return {
-                    'type': 'icon',
-                    'src': href,
-                    'alt': 'Site Icon',
-                    'score': best_candidate['score'],
-                    'source': best_candidate['source']
-                }
+                    href = urllib.parse.urljoin(base_url, href)
+                return LogoInfo(
+                    type='icon',
+                    src=href,
+                    alt='Site Icon',
+                    width=None,
+                    height=None,
+                    score=best_candidate.score,
+                    source=best_candidate.source
+                )
             else:
                 # Candidate normal (img)
-                img = best_candidate['img']
-                src = img.get('src')
+                src = best_candidate.src
                 if src:
                     # Convertir le chemin relatif en absolu si nécessaire
                     if not src.startswith(('http://', 'https://', 'data:')):
-                        src = urllib.parse.urljoin(url, src)
+                        src = urllib.parse.urljoin(base_url, src)
                     
-                    return {
-                        'type': 'img',
-                        'src': src,
-                        'alt': img.get('alt', 'Logo'),
-                        'width': img.get('width'),
-                        'height': img.get('height'),
-                        'score': best_candidate['score'],
-                        'source': best_candidate['source']
-                    }
+                    return LogoInfo(
+                        type='img',
+                        src=src,
+                        alt=best_candidate.alt if best_candidate.alt is not None else 'Logo',
+                        width=best_candidate.width,
+                        height=best_candidate.height,
+                        score=best_candidate.score,
+                        source=best_candidate.source
+                    )
             
         return None
     
     except Exception as e:
         print(f"Erreur lors de l'extraction du logo: {e}")
         return None
+    finally:
+        # L'arbre HTML contient des références circulaires: le détruire explicitement
+        # permet de libérer la mémoire immédiatement sans attendre le ramasse-miettes
+        if soup is not None:
+            soup.decompose()
 
-def download_logo(logo_info, output_folder="logos"):
+def download_logo(logo_info, output_folder="logos", site=None):
     """
-    Télécharge le logo et le sauvegarde localement
+    Télécharge le logo et l'enregistre dans le stockage adressé par contenu de output_folder
+    L'index associe le fichier au site (URL complète, sous-domaine compris) et à l'URL du logo:
+    deux sites d'un même domaine ne peuvent plus s'écraser mutuellement leur logo
     Retourne le chemin du fichier logo
     """
-    if not logo_info or not logo_info.get('src'):
+    if not logo_info or not logo_info.src:
         return None
         
     try:
-        # Créer le dossier de sortie s'il n'existe pas
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-            
         # Récupérer l'URL du logo
-        logo_url = logo_info['src']
+        logo_url = logo_info.src
         
         # Télécharger l'image
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(logo_url, headers=headers, timeout=20)
+        response = http_get(logo_url, headers=headers, timeout=20)
         response.raise_for_status()
         
         # Déterminer le format de l'image
@@ -282,13 +284,8 @@ def download_logo(logo_info, output_folder="logos"):
         else:
             extension = 'png'  # Par défaut
         
-        # Générer un nom de fichier
-        domain = urllib.parse.urlparse(logo_url).netloc.split('.')[-2]
-        filename = f"{output_folder}/logo_{domain}.{extension}"
-        
-        # Sauvegarder l'image
-        with open(filename, 'wb') as f:
-            f.write(response.content)
+        # Sauvegarder l'image (écriture atomique, nom dérivé du contenu)
+        filename = get_store(output_folder).put(response.content, "logo", extension, site=site, source_url=logo_url)
             
         print(f"Logo sauvegardé: {filename}")
         return filename
@@ -297,15 +294,44 @@ def download_logo(logo_info, output_folder="logos"):
         print(f"Erreur lors du téléchargement du logo: {e}")
         return None
 
-def extract_main_images(url, max_images=5):
+def _image_source(img):
+    """
+    URL réelle d'une balise <img>: attributs de chargement différé (data-src...) avant src,
+    qui ne contient souvent qu'un pixel transparent, puis la plus grande entrée de srcset
+    """
+    for attribute in ('data-src', 'data-lazy-src', 'data-original', 'src'):
+        src = (img.get(attribute) or '').strip()
+        if src and not src.startswith('data:'):
+            return src
+
+    best_src, best_size = None, -1.0
+    for entry in (img.get('data-srcset') or img.get('srcset') or '').split(','):
+        parts = entry.split()
+        if not parts:
+            continue
+        try:
+            size = float(parts[1][:-1]) if len(parts) > 1 else 1.0
+        except ValueError:
+            size = 1.0
+        if size > best_size:
+            best_src, best_size = parts[0], size
+    return best_src or (img.get('src') or '').strip()
+
+def extract_main_images(url, max_images=5, max_candidates=20):
     """
     Extrait les images principales du site web (non-logos, images de grande taille)
+    Jusqu'à max_candidates images sont retenues sur la page puis classées par image_ranking.rank_images:
+    seules les max_images plus grandes, hors doublons et espaces réservés, sont retournées
     """
+    soup = None
     try:
+        from bs4 import BeautifulSoup
+
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=20)
+        response = http_get(url, headers=headers, timeout=20)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
+        base_url = _page_base_url(response, soup)
         
         # Exclure ces sections qui contiennent généralement des icônes ou éléments de navigation
         exclude_sections = ['nav', 'footer', '.footer', '#footer', '.nav', '#nav', '.navbar', '#navbar']
@@ -314,10 +340,10 @@ def extract_main_images(url, max_images=5):
                 element.decompose()
         
         # Trouver les grandes images qui ne sont pas des logos
-        main_images = []
+        candidates = []
         for img in soup.find_all('img'):
-            src = img.get('src', '')
-            if not src:
+            src = _image_source(img)
+            if not src or src.startswith('data:'):
                 continue
                 
             # Ignorer les images qui ressemblent à des logos ou des icônes
@@ -325,43 +351,58 @@ def extract_main_images(url, max_images=5):
                 continue
                 
             # Convertir les URL relatives en absolues
-            if not src.startswith(('http://', 'https://', 'data:')):
-                src = urllib.parse.urljoin(url, src)
+            if not src.startswith(('http://', 'https://')):
+                src = urllib.parse.urljoin(base_url, src)
                 
-            # Vérifier les dimensions si disponibles
+            # Écarter sans les télécharger les images déclarées petites
             width = img.get('width')
             height = img.get('height')
             if width and height:
                 try:
-                    if int(width) > 300 or int(height) > 200:
-                        main_images.append(src)
+                    if int(width) <= 300 and int(height) <= 200:
+                        continue
                 except ValueError:
-                    # Si les dimensions ne peuvent pas être converties, inclure l'image quand même
-                    main_images.append(src)
-            else:
-                # Si les dimensions ne sont pas spécifiées, inclure l'image
-                main_images.append(src)
-                
-        # Limiter le nombre d'images retournées
-        return main_images[:max_images]
+                    # Si les dimensions ne peuvent pas être converties, garder l'image
+                    pass
+            
+            if src not in candidates:
+                candidates.append(src)
+            if len(candidates) >= max_candidates:
+                break
         
     except Exception as e:
         print(f"Erreur lors de l'extraction des images principales: {e}")
         return []
+    finally:
+        if soup is not None:
+            soup.decompose()
+    
+    # Classer les candidates sur leurs dimensions réelles (l'arbre HTML est déjà libéré)
+    try:
+        return [image.src for image in rank_images(candidates, max_images)]
+    except Exception as e:
+        print(f"Erreur lors du classement des images principales: {e}")
+        return candidates[:max_images]
 
+@profiled_stage("palette")
 def extract_color_palette(url):
     """
     Extrait une palette de couleurs approximative du site web
     Retourne une liste de couleurs hexadécimales
     """
+    soup = None
     try:
+        from bs4 import BeautifulSoup
+
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=20)
+        response = http_get(url, headers=headers, timeout=20)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
         
         # Extraire les couleurs des styles CSS
-        colors = set()
+        # Dictionnaire plutôt qu'ensemble: ordre de première apparition, identique d'un processus à l'autre
+        # (la palette entre dans le prompt d'image, donc dans la clé des cassettes)
+        colors = {}
         
         # Recherche des balises style
         for style_tag in soup.find_all('style'):
@@ -373,13 +414,13 @@ def extract_color_palette(url):
                         color = f"#{color[0]}{color[0]}{color[1]}{color[1]}{color[2]}{color[2]}"
                     else:
                         color = f"#{color}"
-                    colors.add(color)
+                    colors[color] = None
                 
                 # Recherche de couleurs RGB/RGBA
                 rgb_colors = re.findall(r'rgb\((\d+),\s*(\d+),\s*(\d+)\)', style_tag.string)
                 for r, g, b in rgb_colors:
                     hex_color = f"#{int(r):02x}{int(g):02x}{int(b):02x}"
-                    colors.add(hex_color)
+                    colors[hex_color] = None
         
         # Recherche d'attributs de style inline
         for tag in soup.find_all(attrs={'style': True}):
@@ -390,12 +431,12 @@ def extract_color_palette(url):
                     color = f"#{color[0]}{color[0]}{color[1]}{color[1]}{color[2]}{color[2]}"
                 else:
                     color = f"#{color}"
-                colors.add(color)
+                colors[color] = None
                 
             rgb_colors = re.findall(r'rgb\((\d+),\s*(\d+),\s*(\d+)\)', style)
             for r, g, b in rgb_colors:
                 hex_color = f"#{int(r):02x}{int(g):02x}{int(b):02x}"
-                colors.add(hex_color)
+                colors[hex_color] = None
         
         # Si pas assez de couleurs trouvées, ajouter des couleurs par défaut basées sur des éléments clés
         if len(colors) < 3:
@@ -409,16 +450,19 @@ def extract_color_palette(url):
                             color = f"#{color[0]}{color[0]}{color[1]}{color[1]}{color[2]}{color[2]}"
                         else:
                             color = f"#{color}"
-                        colors.add(color)
+                        colors[color] = None
         
         # Si on trouve encore trop peu de couleurs, ajouter des couleurs par défaut
         if len(colors) < 2:
-            colors.add("#1a73e8")  # Bleu
-            colors.add("#ffffff")  # Blanc
-            colors.add("#333333")  # Gris foncé
+            colors["#1a73e8"] = None  # Bleu
+            colors["#ffffff"] = None  # Blanc
+            colors["#333333"] = None  # Gris foncé
         
         return list(colors)[:5]  # Limiter à 5 couleurs max
         
     except Exception as e:
         print(f"Erreur lors de l'extraction des couleurs: {e}")
-        return ["#1a73e8", "#ffffff", "#333333"]  # Couleurs par défaut
\ No newline at end of file
+        return ["#1a73e8", "#ffffff", "#333333"]  # Couleurs par défaut
+    finally:
+        if soup is not None:
+            soup.decompose()
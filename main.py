@@ -1,90 +1,415 @@
 import os
+import sys
+import json
 import argparse
-from dotenv import load_dotenv
-from web_extractor import analyze_website_for_business_axes
-from business_analyzer import generate_business_description, extract_website_visual_identity
-from enhanced_image_generator import generate_multiple_images_with_assets
-from business_analyzer import generate_ad_prompts_with_visual_identity
-
-def main():
-    # Charger les variables d'environnement
-    load_dotenv()
-    
-    # Configurer l'analyseur d'arguments
+
+# Les modules du pipeline (openai, trafilatura, bs4, PIL...) ne sont importés que
+# dans la sous-commande qui en a besoin: `python main.py --help` reste instantané
+
+SUBCOMMANDS = ("extract", "analyze", "generate", "batch-analyze", "serve", "gc")
+
+def build_parser():
+    """
+    Construit l'analyseur d'arguments avec les sous-commandes extract, analyze, generate, batch-analyze, serve et gc
+    """
     parser = argparse.ArgumentParser(description="Générateur d'images publicitaires avancé basé sur l'analyse d'un site web")
-    parser.add_argument("--url", type=str, help="URL du site web client à analyser")
-    parser.add_argument("--output", type=str, default="images", help="Dossier de sortie pour les images générées")
-    
-    args = parser.parse_args()
-    
-    # Si aucune URL n'est fournie en argument, demander à l'utilisateur
+    subparsers = parser.add_subparsers(dest="command")
+
+    # Options communes à toutes les sous-commandes: enregistrement/rejeu des appels externes
+    common_parser = argparse.ArgumentParser(add_help=False)
+    recording_group = common_parser.add_mutually_exclusive_group()
+    recording_group.add_argument("--record", type=str, metavar="DOSSIER", default=None, help="Enregistrer tous les appels externes dans ce dossier de cassettes")
+    recording_group.add_argument("--replay", type=str, metavar="DOSSIER", default=None, help="Rejouer les appels externes depuis ce dossier de cassettes, sans accès réseau")
+    common_parser.add_argument("--replay-latency", type=float, default=0.0, help="Facteur appliqué à la latence enregistrée lors du rejeu (0: vitesse du disque, 1: latence d'origine)")
+    common_parser.add_argument("--profile", type=str, metavar="DOSSIER", default=None, help="Profiler chaque étape (cProfile; allocations mémoire avec --profile-memory) et écrire les rapports par site dans ce dossier")
+    common_parser.add_argument("--dns-ttl", type=float, default=300, help="Durée (en secondes) de mise en cache des résolutions DNS (0 pour désactiver le cache)")
+    common_parser.add_argument("--profile-memory", action="store_true", help="Avec --profile, suivre aussi les allocations mémoire (tracemalloc): coûteux, ralentit tout le processus")
+    common_parser.add_argument("--profile-sample-rate", type=float, default=None, help="Fraction des sites profilés avec --profile (par défaut: 1, ex: 0.05 pour un usage en production)")
+
+    extract_parser = subparsers.add_parser("extract", parents=[common_parser], help="Extraire le contenu et l'identité visuelle du site (sans appel au LLM)")
+    extract_parser.add_argument("--url", type=str, help="URL du site web client à analyser")
+
+    analyze_parser = subparsers.add_parser("analyze", parents=[common_parser], help="Identifier les axes d'activité et générer les prompts publicitaires")
+    analyze_parser.add_argument("--url", type=str, help="URL du site web client à analyser")
+
+    generate_parser = subparsers.add_parser("generate", parents=[common_parser], help="Exécuter le pipeline complet jusqu'à la génération des images")
+    generate_parser.add_argument("--url", type=str, help="URL du site web client à analyser")
+    generate_parser.add_argument("--output", type=str, default="images", help="Dossier de sortie pour les images générées")
+    generate_parser.add_argument("--stream", type=str, default=None, help="Fichier JSON-lines où écrire chaque image dès qu'elle est prête ('-' pour la sortie standard)")
+    generate_parser.add_argument("--concurrency", type=int, default=4, help="Nombre d'images générées en parallèle")
+    generate_parser.add_argument("--yes", "-y", action="store_true", help="Générer les images sans demander de confirmation")
+    generate_parser.add_argument("--draft", action="store_true", help="Générer d'abord des ébauches basse qualité pour tous les axes, puis ne rendre en haute qualité que celles retenues")
+    generate_parser.add_argument("--select", type=str, default=None, help="Ébauches à rendre en haute qualité: all, none ou des index (ex: 1,3 ou 2-4); demandé interactivement si absent")
+
+    batch_parser = subparsers.add_parser("batch-analyze", parents=[common_parser], help="Identifier les axes d'activité d'une liste de sites avec une tâche batch (sans réponse immédiate)")
+    batch_parser.add_argument("--input", type=str, required=True, help="Fichier listant les URL à analyser (une par ligne)")
+    batch_parser.add_argument("--output", type=str, default="business_axes.jsonl", help="Fichier JSON-lines où écrire les axes de chaque site ('-' pour la sortie standard)")
+    batch_parser.add_argument("--concurrency", type=int, default=4, help="Nombre de sites dont le contenu est extrait en parallèle")
+    batch_parser.add_argument("--poll-interval", type=float, default=30.0, help="Intervalle (en secondes) entre deux vérifications de l'état du lot")
+    batch_parser.add_argument("--timeout", type=float, default=24 * 3600, help="Durée maximale d'attente du lot (en secondes)")
+    batch_parser.add_argument("--work-dir", type=str, default="batches", help="Dossier où conserver les fichiers JSONL des lots soumis")
+    batch_parser.add_argument("--base-url", type=str, default=None, help="URL d'une API compatible OpenAI à utiliser à la place d'Azure OpenAI (ex: faux serveur batch local)")
+
+    serve_parser = subparsers.add_parser("serve", parents=[common_parser], help="Démarrer le service HTTP/JSON avec file de jobs et pool de workers")
+    serve_parser.add_argument("--host", type=str, default="127.0.0.1", help="Adresse d'écoute du service")
+    serve_parser.add_argument("--port", type=int, default=8080, help="Port d'écoute du service")
+    serve_parser.add_argument("--workers", type=int, default=None, help="Nombre de workers (par défaut: nombre de CPU)")
+    serve_parser.add_argument("--output-root", type=str, default="images", help="Dossier racine des images: le champ 'output' d'un job désigne un sous-dossier de cette racine")
+    serve_parser.add_argument("--job-ttl", type=float, default=3600, help="Durée (en secondes) de conservation d'un job terminé et de son résultat")
+    serve_parser.add_argument("--max-finished-jobs", type=int, default=100, help="Nombre maximal de jobs terminés conservés en mémoire")
+
+    gc_parser = subparsers.add_parser("gc", parents=[common_parser], help="Supprimer les fichiers orphelins des dossiers d'images et de logos")
+    gc_parser.add_argument("--images", type=str, default="images", help="Dossier de stockage des images")
+    gc_parser.add_argument("--logos", type=str, default="logos", help="Dossier de stockage des logos")
+    gc_parser.add_argument("--min-age", type=float, default=3600, help="Âge minimal (en secondes) d'un fichier orphelin pour être supprimé")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Lister les fichiers orphelins sans les supprimer")
+
+    return parser
+
+def parse_args(argv=None):
+    """
+    Analyse les arguments de la ligne de commande
+    Sans sous-commande (ancienne syntaxe `main.py --url ...`), le pipeline complet est exécuté
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in SUBCOMMANDS + ("-h", "--help"):
+        argv.insert(0, "generate")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # Les options de profilage n'ont d'effet qu'avec --profile: les ignorer masquerait une erreur de saisie
+    if not args.profile:
+        if args.profile_memory:
+            parser.error("--profile-memory nécessite --profile")
+        if args.profile_sample_rate is not None:
+            parser.error("--profile-sample-rate nécessite --profile")
+    return args
+
+def ask_url(args):
+    """
+    Demande l'URL à l'utilisateur si elle n'a pas été fournie en argument,
+    puis la normalise et résout ses redirections une fois pour toutes les étapes
+    """
+    from url_resolver import resolve_url
+
     if not args.url:
         args.url = input("Entrez l'URL du site web client à analyser: ")
-    
-    print(f"\n1. ANALYSE DU SITE WEB: {args.url}")
+    args.url = resolve_url(args.url)
+    return args.url
+
+def print_visual_identity(business_description, visual_identity):
+    """
+    Affiche la description de l'entreprise et le résumé de l'identité visuelle
+    """
+    print(f"Description de l'entreprise: {business_description}")
+    print(f"\nLogo extrait: {'Oui - ' + visual_identity.logo_path if visual_identity.logo_path else 'Non'}")
+    print(f"Palette de couleurs: {', '.join(visual_identity.colors[:3]) if visual_identity.colors else 'Non disponible'}")
+    print(f"Images principales: {len(visual_identity.main_images)} images extraites")
+
+def print_ui_information(business_description, visual_identity, step):
+    """
+    Affiche les informations destinées à l'interface utilisateur
+    """
+    print(f"\n{step}. INFORMATIONS POUR L'INTERFACE UTILISATEUR")
     print("---------------------------------------------------")
-    print("Extraction du contenu et analyse...")
-    
-    # Analyser le site web pour identifier les axes d'activité
-    business_axes = analyze_website_for_business_axes(args.url)
-    
-    # Générer une description concise de l'entreprise
-    print("\nGénération de la description de l'entreprise...")
-    business_description = generate_business_description(args.url)
-    
-    # Extraire l'identité visuelle (logo, images, couleurs)
-    print("\nExtraction de l'identité visuelle (logo, images, couleurs)...")
-    visual_identity = extract_website_visual_identity(args.url)
-    
+    print(f"Description de l'entreprise pour affichage: {business_description}")
+    if visual_identity.logo_path:
+        print(f"Chemin du logo pour affichage: {visual_identity.logo_path}")
+
+def print_progress(event):
+    """
+    Affiche un événement de progression émis par le pipeline
+    """
+    print(f"\n{event['message']}")
+
+def run_extract(args):
+    """
+    Sous-commande extract: contenu textuel et identité visuelle, sans appel au LLM
+    """
+    from pipeline import extract_site
+
+    url = args.url
+
+    print(f"\n1. EXTRACTION DU SITE WEB: {url}")
+    print("---------------------------------------------------")
+    extraction = extract_site(url, print_progress)
+    content = extraction.content
+
     print("\n2. INFORMATIONS EXTRAITES:")
     print("---------------------------------------------------")
-    print(f"Description de l'entreprise: {business_description}")
-    print(f"\nLogo extrait: {'Oui - ' + visual_identity['logo']['path'] if visual_identity['logo']['path'] else 'Non'}")
-    print(f"Palette de couleurs: {', '.join(visual_identity['colors'][:3]) if visual_identity['colors'] else 'Non disponible'}")
-    print(f"Images principales: {len(visual_identity['main_images']) if visual_identity['main_images'] else 0} images extraites")
-    
+    print(f"Contenu extrait: {len(content) if content else 0} caractères")
+    if content:
+        print(content[:500])
+    print()
+    print_visual_identity(extraction.business_description, extraction.visual_identity)
+
+def analyze_site(url):
+    """
+    Étapes 1 à 4 du pipeline: analyse du site, identité visuelle et génération des prompts
+    Retourne (business_axes, business_description, visual_identity, image_prompts)
+    """
+    import pipeline
+
+    print(f"\n1. ANALYSE DU SITE WEB: {url}")
+    print("---------------------------------------------------")
+    analysis = pipeline.analyze_site(url, print_progress)
+    business_axes = analysis.business_axes
+    business_description = analysis.business_description
+    visual_identity = analysis.visual_identity
+    image_prompts = analysis.image_prompts
+
+    print("\n2. INFORMATIONS EXTRAITES:")
+    print("---------------------------------------------------")
+    print_visual_identity(business_description, visual_identity)
+
     print("\n3. AXES D'ACTIVITÉ IDENTIFIÉS:")
     print("---------------------------------------------------")
     for i, axis in enumerate(business_axes, 1):
         print(f"{i}. {axis}")
-    
-    print("\n4. GÉNÉRATION DES PROMPTS AVEC IDENTITÉ VISUELLE")
+
+    print("\n4. PROMPTS AVEC IDENTITÉ VISUELLE")
     print("---------------------------------------------------")
-    # Générer des prompts pour les images en intégrant l'identité visuelle
-    image_prompts = generate_ad_prompts_with_visual_identity(business_axes, visual_identity)
-    
     # Afficher les prompts générés
     for i, prompt in enumerate(image_prompts, 1):
         print(f"\nPrompt {i} (pour l'axe '{business_axes[i-1]}'):")
         print("-" * 50)
         print(prompt)
         print("-" * 50)
-    
+
+    return business_axes, business_description, visual_identity, image_prompts
+
+def run_analyze(args):
+    """
+    Sous-commande analyze: axes d'activité et prompts, sans génération d'images
+    """
+    url = args.url
+    _, business_description, visual_identity, _ = analyze_site(url)
+    print_ui_information(business_description, visual_identity, 5)
+
+# Sortie standard réservée au flux JSON-lines quand il y est écrit ('-'): voir reserve_stdout_for_stream
+_stream_stdout = None
+
+def reserve_stdout_for_stream():
+    """
+    Réserve la sortie standard au flux JSON-lines: tous les messages de progression (y compris ceux
+    des threads de génération) sont redirigés vers la sortie d'erreur, pour qu'une interface qui lit
+    la sortie standard ne reçoive que des lignes JSON complètes
+    """
+    global _stream_stdout
+    if _stream_stdout is None:
+        _stream_stdout = sys.stdout
+        sys.stdout = sys.stderr
+
+def open_stream(path):
+    """
+    Ouvre le flux JSON-lines des résultats ('-' pour la sortie standard, None pour aucun flux)
+    """
+    if not path:
+        return None
+    if path == "-":
+        reserve_stdout_for_stream()
+        return _stream_stdout
+    return open(path, "a", encoding="utf-8")
+
+def close_stream(stream):
+    """
+    Ferme le flux JSON-lines s'il s'agit d'un fichier
+    """
+    if stream and stream is not _stream_stdout:
+        stream.close()
+
+def stream_results(results, stream):
+    """
+    Parcourt les résultats de génération en écrivant chacun dans le flux JSON-lines dès qu'il est prêt
+    """
+    collected = []
+    for result in results:
+        collected.append(result)
+        if stream:
+            stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+            stream.flush()
+    return collected
+
+def ask_selection(count):
+    """
+    Demande les ébauches à rendre en haute qualité jusqu'à obtenir une politique valide
+    """
+    from pipeline import parse_selection
+
+    while True:
+        selection = input(f"\nÉbauches à rendre en haute qualité (all, none ou index de 1 à {count}, ex: 1,3): ")
+        try:
+            parse_selection(selection, count)
+            return selection
+        except ValueError as e:
+            print(f"{e}. Veuillez réessayer.")
+
+def run_generate(args):
+    """
+    Sous-commande generate: pipeline complet jusqu'à la génération des images avec logo
+    """
+    url = args.url
+    business_axes, business_description, visual_identity, image_prompts = analyze_site(url)
+
     # Demander confirmation à l'utilisateur
-    confirmation = input("\nVoulez-vous générer les images avec ces prompts? (O/n): ")
+    confirmation = "o" if args.yes else input("\nVoulez-vous générer les images avec ces prompts? (O/n): ")
     if confirmation.lower() in ["", "o", "oui", "y", "yes"]:
-        print("\n5. GÉNÉRATION DES IMAGES AVEC LOGO")
-        print("---------------------------------------------------")
-        # Générer les images en intégrant le logo et les couleurs
-        image_files = generate_multiple_images_with_assets(image_prompts, visual_identity, args.output)
-        
+        from enhanced_image_generator import iter_images_with_assets, iter_drafts_with_assets, iter_final_images
+        from pipeline import select_drafts, parse_selection
+
+        # Une politique --select invalide est refusée avant de générer (et payer) les ébauches
+        if args.draft and args.select is not None:
+            try:
+                parse_selection(args.select, len(image_prompts))
+            except ValueError as e:
+                print(f"Erreur: {e}")
+                return
+
+        stream = open_stream(args.stream)
+        try:
+            if args.draft:
+                print("\n5. GÉNÉRATION DES ÉBAUCHES AVEC LOGO")
+                print("---------------------------------------------------")
+                drafts = stream_results(iter_drafts_with_assets(image_prompts, visual_identity, args.output, business_axes, args.concurrency, site=url), stream)
+                for draft in drafts:
+                    print(f"Ébauche {draft['index']}: {draft['path'] or 'échec'} - Axe: '{draft['axis']}' ({draft['elapsed']:.1f} s)")
+
+                # Politique de sélection fournie en argument, sinon choix de l'utilisateur (redemandé tant qu'il est invalide)
+                selection = args.select
+                if selection is None:
+                    selection = "all" if args.yes else ask_selection(len(drafts))
+                selected = select_drafts(drafts, selection)
+
+                print(f"\nRendu haute qualité de {len(selected)} ébauche(s)...")
+                results = stream_results(iter_final_images(selected, visual_identity, args.output, args.concurrency, site=url), stream)
+            else:
+                print("\n5. GÉNÉRATION DES IMAGES AVEC LOGO")
+                print("---------------------------------------------------")
+                # Générer les images en intégrant le logo et les couleurs, chacune étant écrite dans le flux dès qu'elle est prête
+                results = stream_results(iter_images_with_assets(image_prompts, visual_identity, args.output, business_axes, args.concurrency, site=url), stream)
+        finally:
+            close_stream(stream)
+        results = [result for result in sorted(results, key=lambda result: result['index']) if result['path']]
+
         print("\n6. RÉSUMÉ")
         print("---------------------------------------------------")
-        if image_files:
-            print(f"{len(image_files)} images ont été générées dans le dossier '{args.output}':")
-            for i, file in enumerate(image_files, 1):
-                print(f"{i}. {file} - Basée sur l'axe: '{business_axes[i-1]}'")
+        if results:
+            print(f"{len(results)} images ont été générées dans le dossier '{args.output}':")
+            for i, result in enumerate(results, 1):
+                print(f"{i}. {result['path']} - Basée sur l'axe: '{result['axis']}' ({result['elapsed']:.1f} s)")
         else:
-            print("Aucune image n'a été générée. Vérifiez les erreurs ci-dessus.")
+            print("Aucune image haute qualité n'a été générée." if args.draft else "Aucune image n'a été générée. Vérifiez les erreurs ci-dessus.")
     else:
         print("Génération d'images annulée.")
-    
+
     # Afficher les informations pour l'interface utilisateur
-    print("\n7. INFORMATIONS POUR L'INTERFACE UTILISATEUR")
-    print("---------------------------------------------------")
-    print(f"Description de l'entreprise pour affichage: {business_description}")
-    if visual_identity['logo']['path']:
-        print(f"Chemin du logo pour affichage: {visual_identity['logo']['path']}")
+    print_ui_information(business_description, visual_identity, 7)
+
+def run_batch_analyze(args):
+    """
+    Sous-commande batch-analyze: analyse des axes d'activité de nombreux sites via l'API batch
+    """
+    from batch_analyzer import OpenAIBatchTransport, read_sites, analyze_sites_in_batch
+
+    if args.base_url:
+        def client_factory():
+            from openai import OpenAI
+            return OpenAI(base_url=args.base_url, api_key=os.getenv("OPENAI_API_KEY", "local"))
+    else:
+        from config_azure_openai import init_azure_openai as client_factory
+
+    sites = read_sites(args.input)
+    if not sites:
+        print(f"Aucun site à analyser dans {args.input}")
+        return
+
+    results = analyze_sites_in_batch(
+        sites,
+        OpenAIBatchTransport(client_factory),
+        max_workers=args.concurrency,
+        poll_interval=args.poll_interval,
+        timeout=args.timeout,
+        work_dir=args.work_dir
+    )
+
+    stream = open_stream(args.output)
+    try:
+        for site, business_axes in results.items():
+            stream.write(json.dumps({'url': site, 'business_axes': business_axes}, ensure_ascii=False) + "\n")
+            stream.flush()
+    finally:
+        close_stream(stream)
+    print(f"Axes d'activité de {len(results)} site(s) écrits dans {args.output}")
+
+def run_serve(args):
+    """
+    Sous-commande serve: service HTTP/JSON longue durée avec clients et caches gardés au chaud
+    """
+    from service import serve
+    serve(args.host, args.port, args.workers, args.output_root, args.job_ttl, args.max_finished_jobs)
+
+def run_gc(args):
+    """
+    Sous-commande gc: supprime les fichiers absents de l'index et les images brutes laissées par d'anciennes exécutions
+    """
+    from storage import AssetStore
+
+    for folder in (args.images, args.logos):
+        orphans = AssetStore(folder, create=False).gc(dry_run=args.dry_run, min_age=args.min_age)
+        action = "à supprimer" if args.dry_run else "supprimé(s)"
+        print(f"{folder}: {len(orphans)} fichier(s) orphelin(s) {action}")
+        for path in orphans:
+            print(f"  {path}")
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Avec un flux sur la sortie standard, les messages lisibles passent dès le départ par la sortie d'erreur
+    if getattr(args, "stream", None) == "-" or (args.command == "batch-analyze" and args.output == "-"):
+        reserve_stdout_for_stream()
+
+    # Charger les variables d'environnement (après l'analyse des arguments: --help n'en a pas besoin)
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    if args.record or args.replay:
+        import recorder
+        if args.record:
+            recorder.configure("record", args.record)
+        else:
+            recorder.configure("replay", args.replay, args.replay_latency)
+
+    if args.dns_ttl > 0:
+        from url_resolver import enable_dns_cache
+        enable_dns_cache(args.dns_ttl)
+
+    if args.profile:
+        import profiling
+        profiling.configure(args.profile, 1.0 if args.profile_sample_rate is None else args.profile_sample_rate, memory=args.profile_memory)
+
+    if args.command == "serve":
+        run_serve(args)
+        return
+
+    if args.command == "batch-analyze":
+        run_batch_analyze(args)
+        return
+
+    if args.command == "gc":
+        run_gc(args)
+        return
+
+    commands = {
+        "extract": run_extract,
+        "analyze": run_analyze,
+        "generate": run_generate,
+    }
+
+    # Une session de profilage par site (sans effet si --profile n'est pas utilisé)
+    from profiling import site_session
+    ask_url(args)
+    with site_session(args.url):
+        commands[args.command](args)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
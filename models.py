@@ -0,0 +1,82 @@
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+
+# Structures de données du pipeline
+# Elles ne contiennent que des chaînes et des nombres extraits de la page: aucune référence
+# vers l'arbre BeautifulSoup n'est conservée, qui peut ainsi être libéré dès la fin de l'extraction.
+# Les __slots__ sont déclarés explicitement (sans valeurs par défaut) pour rester compatibles
+# avec Python 3.8, où dataclass(slots=True) n'existe pas.
+
+@dataclass
+class LogoCandidate:
+    """
+    Candidat logo retenu pendant le calcul des scores de extract_logo
+    """
+    __slots__ = ('src', 'alt', 'width', 'height', 'score', 'source', 'is_favicon')
+    src: str
+    alt: str
+    width: Optional[str]
+    height: Optional[str]
+    score: int
+    source: str
+    is_favicon: bool
+
+@dataclass
+class LogoInfo:
+    """
+    Logo sélectionné pour un site (type 'img' ou 'icon'), avec une URL absolue
+    """
+    __slots__ = ('type', 'src', 'alt', 'width', 'height', 'score', 'source')
+    type: str
+    src: str
+    alt: str
+    width: Optional[str]
+    height: Optional[str]
+    score: int
+    source: str
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class ImageCandidate:
+    """
+    Image principale candidate après décodage: dimensions réelles et empreinte perceptuelle (dHash 64 bits)
+    """
+    __slots__ = ('src', 'width', 'height', 'dhash')
+    src: str
+    width: int
+    height: int
+    dhash: int
+
+@dataclass
+class VisualIdentity:
+    """
+    Identité visuelle d'un site: logo, chemin du logo téléchargé, images principales et palette de couleurs
+    """
+    __slots__ = ('logo', 'logo_path', 'main_images', 'colors')
+    logo: Optional[LogoInfo]
+    logo_path: Optional[str]
+    main_images: List[str]
+    colors: List[str]
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class SiteAnalysis:
+    """
+    Résultat du pipeline pour un site (pipeline.extract_site, pipeline.analyze_site, pipeline.run_job)
+    Les champs non calculés par la commande exécutée restent vides
+    """
+    __slots__ = ('url', 'content', 'business_axes', 'business_description', 'visual_identity', 'image_prompts', 'images')
+    url: str
+    content: Optional[str]
+    business_axes: List[str]
+    business_description: str
+    visual_identity: VisualIdentity
+    image_prompts: List[str]
+    images: List[dict]
+
+    def to_dict(self):
+        return asdict(self)
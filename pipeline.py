@@ -0,0 +1,179 @@
+import time
+from models import SiteAnalysis
+
+# Pipeline sans interaction utilisateur, partagé par la CLI (main.py) et le mode service (service.py)
+# Chaque étape signale sa progression via un callback `emit(event)` recevant un dictionnaire
+
+def _emit(emit, stage, message, **data):
+    """
+    Transmet un événement de progression au callback s'il est défini
+    """
+    if emit:
+        event = {'stage': stage, 'message': message, 'time': time.time()}
+        event.update(data)
+        emit(event)
+
+def extract_site(url, emit=None):
+    """
+    Extrait le contenu textuel, la description et l'identité visuelle d'un site, sans appel au LLM
+    """
+    from web_extractor import extract_website_content
+    from business_analyzer import generate_business_description, extract_website_visual_identity
+
+    _emit(emit, 'content', "Extraction du contenu...")
+    content = extract_website_content(url)
+
+    _emit(emit, 'description', "Génération de la description de l'entreprise...")
+    business_description = generate_business_description(url)
+
+    _emit(emit, 'visual_identity', "Extraction de l'identité visuelle (logo, images, couleurs)...")
+    visual_identity = extract_website_visual_identity(url)
+
+    return SiteAnalysis(
+        url=url,
+        content=content,
+        business_axes=[],
+        business_description=business_description,
+        visual_identity=visual_identity,
+        image_prompts=[],
+        images=[]
+    )
+
+def analyze_site(url, emit=None):
+    """
+    Identifie les axes d'activité, la description, l'identité visuelle et génère les prompts publicitaires
+    """
+    from web_extractor import analyze_website_for_business_axes
+    from business_analyzer import generate_business_description, extract_website_visual_identity
+    from business_analyzer import generate_ad_prompts_with_visual_identity
+
+    _emit(emit, 'business_axes', "Extraction du contenu et analyse...")
+    business_axes = analyze_website_for_business_axes(url)
+
+    _emit(emit, 'description', "Génération de la description de l'entreprise...")
+    business_description = generate_business_description(url)
+
+    _emit(emit, 'visual_identity', "Extraction de l'identité visuelle (logo, images, couleurs)...")
+    visual_identity = extract_website_visual_identity(url)
+
+    _emit(emit, 'prompts', "Génération des prompts avec identité visuelle...")
+    image_prompts = generate_ad_prompts_with_visual_identity(business_axes, visual_identity)
+
+    # Le contenu brut n'est pas conservé: seuls les axes qui en sont tirés sont utiles à la suite
+    return SiteAnalysis(
+        url=url,
+        content=None,
+        business_axes=business_axes,
+        business_description=business_description,
+        visual_identity=visual_identity,
+        image_prompts=image_prompts,
+        images=[]
+    )
+
+def parse_selection(selection, count=None):
+    """
+    Analyse une politique de sélection d'ébauches: 'all' (toutes), 'none' (aucune) ou des index
+    à partir de 1 ('1,3' ou '2-4'); avec count (nombre d'ébauches), les index doivent aussi exister
+    Sans politique (None), toutes les ébauches sont retenues; une chaîne vide n'en retient aucune
+    Retourne None pour toutes les ébauches, sinon l'ensemble des index retenus
+    Lève ValueError pour une politique invalide (y compris une valeur qui n'est pas une chaîne),
+    afin de la refuser avant de générer les ébauches
+    """
+    if selection is None:
+        return None
+    if not isinstance(selection, str):
+        raise ValueError(f"Sélection d'ébauches invalide: {selection!r} (chaîne attendue, ex: \"1,3\")")
+    text = (selection or "none").strip().lower()
+    if text in ("all", "tout", "toutes"):
+        return None
+    if text in ("none", "aucun", "aucune"):
+        return set()
+
+    expected = "attendu: all, none ou des index comme 1,3 ou 2-4"
+    wanted = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                first, last = (int(bound) for bound in part.split("-", 1))
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"Sélection d'ébauches invalide: {selection} ({expected})")
+        if first > last:
+            raise ValueError(f"Sélection d'ébauches invalide: intervalle décroissant {part}")
+        if first < 1 or (count is not None and last > count):
+            limit = f"vont de 1 à {count}" if count is not None else "commencent à 1"
+            raise ValueError(f"Sélection d'ébauches invalide: {part} (les index {limit})")
+        wanted.update(range(first, last + 1))
+
+    if not wanted:
+        raise ValueError(f"Sélection d'ébauches invalide: {selection} ({expected})")
+    return wanted
+
+def select_drafts(drafts, selection="all"):
+    """
+    Retient les ébauches à rendre en haute qualité selon une politique de sélection (voir parse_selection)
+    Les ébauches dont la génération a échoué ne sont jamais retenues
+    """
+    wanted = parse_selection(selection, len(drafts))
+    available = [draft for draft in drafts if draft['path']]
+    if wanted is None:
+        return available
+    return [draft for draft in available if draft['index'] in wanted]
+
+def generate_site_images(analysis, output_folder="images", emit=None, max_workers=4, draft=False, select="all"):
+    """
+    Génère les images publicitaires à partir du résultat de analyze_site
+    Un événement 'image' est émis dès que chaque image est prête
+    En mode ébauche (draft=True), tous les axes sont d'abord rendus en basse qualité (événements 'draft'),
+    puis seules les ébauches retenues par la politique `select` sont rendues en haute qualité
+    Retourne la liste des résultats par image (ébauches comprises), dans l'ordre des axes
+    """
+    from enhanced_image_generator import iter_images_with_assets, iter_drafts_with_assets, iter_final_images, DRAFT_QUALITY
+
+    results = []
+    if draft:
+        # Politique validée avant de payer les ébauches
+        parse_selection(select, len(analysis.image_prompts))
+        _emit(emit, 'generation', f"Génération de {len(analysis.image_prompts)} ébauches...")
+        drafts = []
+        for result in iter_drafts_with_assets(analysis.image_prompts, analysis.visual_identity, output_folder, analysis.business_axes, max_workers, site=analysis.url):
+            _emit(emit, 'draft', f"Ébauche {result['index']} prête: {result['path']}", image=result)
+            drafts.append(result)
+        results.extend(drafts)
+
+        selected = select_drafts(drafts, select)
+        _emit(emit, 'selection', f"{len(selected)} ébauches retenues pour le rendu final", selected=[result['index'] for result in selected])
+        images = iter_final_images(selected, analysis.visual_identity, output_folder, max_workers, site=analysis.url)
+    else:
+        _emit(emit, 'generation', f"Génération de {len(analysis.image_prompts)} images...")
+        images = iter_images_with_assets(analysis.image_prompts, analysis.visual_identity, output_folder, analysis.business_axes, max_workers, site=analysis.url)
+
+    for result in images:
+        _emit(emit, 'image', f"Image {result['index']} prête: {result['path']}", image=result)
+        results.append(result)
+
+    # Pour chaque axe, l'ébauche précède son rendu final
+    return sorted(results, key=lambda result: (result['index'], result['quality'] != DRAFT_QUALITY))
+
+def run_job(url, command="generate", output_folder="images", emit=None, draft=False, select="all"):
+    """
+    Exécute une commande du pipeline (extract, analyze ou generate) sans confirmation utilisateur
+    L'URL est normalisée et ses redirections résolues une seule fois avant toutes les étapes
+    Retourne un SiteAnalysis (to_dict() pour la sérialisation JSON)
+    """
+    from profiling import site_session
+    from url_resolver import resolve_url
+
+    url = resolve_url(url)
+    with site_session(url):
+        if command == "extract":
+            return extract_site(url, emit)
+
+        result = analyze_site(url, emit)
+        if command == "generate":
+            result.images = generate_site_images(result, output_folder, emit, draft=draft, select=select)
+        return result
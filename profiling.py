@@ -0,0 +1,268 @@
+import os
+import re
+import json
+import time
+import random
+import pstats
+import cProfile
+import functools
+import threading
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Profilage optionnel du pipeline, étape par étape (cProfile pour le CPU, tracemalloc pour la mémoire)
+#
+# Une session est ouverte par site avec site_session(url); chaque étape instrumentée avec
+# profile_stage(nom) ou @profiled_stage(nom) y accumule son profil. À la fin du site, la session écrit
+# dans <dossier>/<site>/<horodatage>/:
+#   <étape>.pstats        profil CPU cumulé de l'étape (lisible avec pstats ou snakeviz)
+#   <étape>_alloc.txt     principales allocations mémoire de chaque exécution de l'étape (avec memory=True)
+#   summary.json          nombre d'exécutions, durée, coût du profilage et variation mémoire par étape
+#
+# Le suivi mémoire (memory=True, option --profile-memory) est coûteux: tracemalloc ralentit toutes
+# les allocations du processus, y compris celles des jobs non profilés en mode service, tant qu'une
+# session profilée est ouverte, et chaque instantané parcourt toutes les allocations suivies (plusieurs
+# secondes avec quelques centaines de milliers d'objets). Il est destiné au diagnostic ponctuel; en
+# production, seul le profil CPU reste actif. La durée des étapes exclut le coût du profilage, qui est
+# reporté séparément (profiler_overhead) dans summary.json.
+#
+# Avec un taux d'échantillonnage inférieur à 1, seule cette fraction des sites est profilée: pour les
+# autres, profile_stage se résume à la lecture d'une variable de contexte, ce qui permet de laisser
+# le profilage actif en production.
+#
+# Limites: tracemalloc suit tout le processus, donc les allocations d'étapes exécutées en parallèle
+# (générations d'images) se mélangent; depuis Python 3.12, un seul profil cProfile peut être actif à la
+# fois: une étape qui démarre pendant qu'une autre est profilée dans un autre thread n'a que sa durée
+# et sa mémoire mesurées.
+
+_config = {
+    'output_dir': None,
+    'sample_rate': 1.0,
+    'top': 25,
+    'memory': False,
+}
+_current_session = contextvars.ContextVar("profiling_session", default=None)
+_thread_state = threading.local()
+
+# tracemalloc est global au processus: il reste actif tant qu'au moins une session est ouverte
+_tracing = {'sessions': 0, 'owned': False}
+_tracing_lock = threading.Lock()
+
+def _acquire_tracemalloc():
+    with _tracing_lock:
+        if _tracing['sessions'] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing['owned'] = True
+        _tracing['sessions'] += 1
+
+def _release_tracemalloc():
+    with _tracing_lock:
+        _tracing['sessions'] -= 1
+        if _tracing['sessions'] == 0 and _tracing['owned']:
+            tracemalloc.stop()
+            _tracing['owned'] = False
+
+def configure(output_dir, sample_rate=1.0, top=25, memory=False):
+    """
+    Active le profilage: output_dir reçoit les rapports, sample_rate est la fraction des sites profilés
+    memory active en plus le suivi des allocations avec tracemalloc (coûteux, voir plus haut)
+    """
+    if not 0.0 <= sample_rate <= 1.0:
+        raise ValueError(f"Le taux d'échantillonnage doit être compris entre 0 et 1: {sample_rate}")
+    _config['output_dir'] = output_dir
+    _config['sample_rate'] = sample_rate
+    _config['top'] = top
+    _config['memory'] = memory
+
+def is_enabled():
+    return _config['output_dir'] is not None
+
+class StageStats:
+    """
+    Mesures cumulées d'une étape pour un site
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_time = 0.0
+        self.memory_delta = 0
+        self.overhead = 0.0
+        self.profiles = []
+        self.allocation_reports = []
+
+class ProfileSession:
+    """
+    Session de profilage d'un site: regroupe les mesures de chaque étape et écrit les rapports
+    """
+
+    def __init__(self, site, output_dir, top=25, memory=False):
+        slug = re.sub(r'[^A-Za-z0-9._-]+', '_', re.sub(r'^https?://', '', site)).strip('_') or "site"
+        self.site = site
+        self.top = top
+        self.memory = memory
+        self.directory = os.path.join(output_dir, slug[:100], datetime.now().strftime("%Y%m%d_%H%M%S_%f"))
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, wall_time, overhead, memory_delta, profile, allocation_report):
+        with self.lock:
+            stats = self.stages.setdefault(stage, StageStats())
+            stats.calls += 1
+            stats.wall_time += wall_time
+            stats.overhead += overhead
+            stats.memory_delta += memory_delta
+            if profile is not None:
+                stats.profiles.append(profile)
+            if allocation_report is not None:
+                stats.allocation_reports.append(allocation_report)
+
+    def close(self):
+        """
+        Écrit les rapports de chaque étape
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        summary = {'site': self.site, 'stages': {}}
+        for stage, stats in self.stages.items():
+            if stats.profiles:
+                pstats.Stats(*stats.profiles).dump_stats(os.path.join(self.directory, f"{stage}.pstats"))
+            if stats.allocation_reports:
+                with open(os.path.join(self.directory, f"{stage}_alloc.txt"), "w", encoding="utf-8") as f:
+                    f.write("\n\n".join(stats.allocation_reports))
+            summary['stages'][stage] = {
+                'calls': stats.calls,
+                'wall_time': round(stats.wall_time, 4),
+                'profiler_overhead': round(stats.overhead, 4),
+                'memory_delta_kib': round(stats.memory_delta / 1024, 1) if self.memory else None,
+                'cpu_profiled_calls': len(stats.profiles)
+            }
+        summary['profiler_overhead'] = round(sum(stats.overhead for stats in self.stages.values()), 4)
+
+        with open(os.path.join(self.directory, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Rapports de profilage écrits dans {self.directory}")
+
+@contextmanager
+def site_session(site):
+    """
+    Ouvre une session de profilage pour un site si le profilage est actif et que le site est échantillonné
+    """
+    if not is_enabled() or random.random() >= _config['sample_rate']:
+        yield None
+        return
+
+    session = ProfileSession(site, _config['output_dir'], _config['top'], _config['memory'])
+    if session.memory:
+        _acquire_tracemalloc()
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+        if session.memory:
+            _release_tracemalloc()
+        session.close()
+
+# Les allocations de tracemalloc lui-même (instantanés) sont exclues des rapports
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+)
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+def _format_allocations(stage, differences, top):
+    """
+    Rapport texte des principales différences d'allocation entre deux instantanés tracemalloc
+    """
+    lines = [f"# {stage} - {datetime.now().isoformat(timespec='seconds')}"]
+    lines.extend(str(difference) for difference in differences[:top])
+    return "\n".join(lines)
+
+@contextmanager
+def profile_stage(stage):
+    """
+    Profile une étape du pipeline dans la session courante (sans effet hors session)
+    Les étapes imbriquées dans un même thread suspendent le profil CPU de l'étape englobante,
+    dont la durée exclut le coût de profilage des étapes imbriquées
+    """
+    session = _current_session.get()
+    if session is None:
+        yield
+        return
+
+    overhead_start = time.perf_counter()
+    stack = getattr(_thread_state, 'stack', None)
+    if stack is None:
+        stack = _thread_state.stack = []
+        _thread_state.overhead = 0.0
+
+    outer = stack[-1] if stack else None
+    if outer is not None:
+        outer.disable()
+
+    # Instantané pris avant d'activer le profil CPU pour ne pas mesurer son propre coût
+    before = _take_snapshot() if session.memory else None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Un autre profil est déjà actif dans un autre thread (Python 3.12+)
+        profile = None
+
+    stack.append(profile or _NullProfile())
+    nested_overhead_start = _thread_state.overhead
+    start = time.perf_counter()
+    overhead = start - overhead_start
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if profile is not None:
+            profile.disable()
+        stack.pop()
+        # Coût de profilage des étapes imbriquées, déjà compté dans leur propre overhead
+        nested_overhead = _thread_state.overhead - nested_overhead_start
+        wall_time = end - start - nested_overhead
+
+        memory_delta, allocation_report = 0, None
+        if before is not None:
+            # Une seule comparaison, utilisée pour la variation totale et pour le rapport
+            differences = _take_snapshot().compare_to(before, 'lineno')
+            memory_delta = sum(difference.size_diff for difference in differences)
+            allocation_report = _format_allocations(stage, differences, session.top)
+
+        overhead += time.perf_counter() - end
+        _thread_state.overhead += overhead
+        session.add(stage, wall_time, overhead, memory_delta, profile, allocation_report)
+        if outer is not None:
+            try:
+                outer.enable()
+            except ValueError:
+                pass
+
+class _NullProfile:
+    """
+    Remplace un profil qui n'a pas pu être activé dans la pile des étapes imbriquées
+    """
+
+    def enable(self):
+        pass
+
+    def disable(self):
+        pass
+
+def profiled_stage(stage):
+    """
+    Décorateur équivalent à profile_stage pour une fonction entière
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
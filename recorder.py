@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import tempfile
+import threading
+
+# Couche d'enregistrement/rejeu des appels externes (requêtes HTTP, API HTML vers Markdown,
+# complétions Azure OpenAI et générations d'images OpenAI)
+#
+# Modes:
+#   off     appels réels, rien n'est enregistré (par défaut)
+#   record  appels réels, chaque requête/réponse est enregistrée dans une cassette sur disque
+#   replay  aucune requête réseau: les réponses sont relues depuis les cassettes
+#
+# Configuration: configure() ou variables d'environnement RECORDER_MODE, RECORDER_CASSETTE_DIR
+# et RECORDER_REPLAY_LATENCY (0 = vitesse du disque, 1 = latence enregistrée)
+
+MODES = ("off", "record", "replay")
+
+_config = {
+    'mode': os.getenv("RECORDER_MODE", "off"),
+    'cassette_dir': os.getenv("RECORDER_CASSETTE_DIR", "cassettes"),
+    'replay_latency': float(os.getenv("RECORDER_REPLAY_LATENCY", "0")),
+}
+_write_lock = threading.Lock()
+
+def configure(mode, cassette_dir="cassettes", replay_latency=0.0):
+    """
+    Active un mode d'enregistrement ou de rejeu pour tout le processus
+    replay_latency est un facteur appliqué à la latence enregistrée lors du rejeu
+    """
+    if mode not in MODES:
+        raise ValueError(f"Mode d'enregistrement inconnu: {mode} (attendu: {', '.join(MODES)})")
+    _config['mode'] = mode
+    _config['cassette_dir'] = cassette_dir
+    _config['replay_latency'] = replay_latency
+
+def get_mode():
+    return _config['mode']
+
+class RecordedResponse:
+    """
+    Réponse HTTP relue depuis une cassette, compatible avec l'usage fait de requests.Response dans le projet
+    """
+
+    def __init__(self, status_code, url, headers, content):
+        self.status_code = status_code
+        self.url = url
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+def _cassette_path(kind, request):
+    """
+    Chemin de la cassette correspondant à une requête (clé: empreinte SHA-256 de la requête normalisée)
+    """
+    key = json.dumps({'kind': kind, 'request': request}, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(_config['cassette_dir'], kind, f"{digest}.json")
+
+def _save_cassette(path, cassette):
+    """
+    Écrit une cassette de façon atomique (fichier temporaire puis renommage)
+    """
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+def _load_cassette(kind, request):
+    """
+    Relit une cassette et simule la latence enregistrée si demandé
+    """
+    path = _cassette_path(kind, request)
+    if not os.path.exists(path):
+        raise LookupError(f"Aucune cassette enregistrée pour {kind}: {json.dumps(request, ensure_ascii=False, default=str)[:200]}")
+    with open(path, encoding="utf-8") as f:
+        cassette = json.load(f)
+    if _config['replay_latency'] > 0:
+        time.sleep(cassette.get('elapsed', 0) * _config['replay_latency'])
+    if cassette.get('error'):
+        raise RuntimeError(f"Erreur enregistrée lors de l'appel {kind}: {cassette['error']}")
+    return cassette['response']
+
+def recorded_call(kind, request, live_call, serialize=lambda result: result, deserialize=lambda data: data):
+    """
+    Exécute un appel externe selon le mode courant
+    - request: description sérialisable de la requête, qui sert de clé à la cassette
+    - live_call: fonction sans argument qui effectue l'appel réel
+    - serialize/deserialize: conversion du résultat vers/depuis le JSON de la cassette
+    """
+    mode = _config['mode']
+    if mode == "replay":
+        return deserialize(_load_cassette(kind, request))
+    if mode != "record":
+        return live_call()
+
+    path = _cassette_path(kind, request)
+    start = time.perf_counter()
+    try:
+        result = live_call()
+    except Exception as e:
+        _save_cassette(path, {'kind': kind, 'request': request, 'elapsed': time.perf_counter() - start, 'error': str(e)})
+        raise
+    _save_cassette(path, {'kind': kind, 'request': request, 'elapsed': time.perf_counter() - start, 'response': serialize(result)})
+    return result
+
+def _serialize_http_response(response):
+    return {
+        'status_code': response.status_code,
+        'url': response.url,
+        'headers': dict(response.headers),
+        'content': base64.b64encode(response.content).decode("ascii")
+    }
+
+def _deserialize_http_response(data):
+    return RecordedResponse(data['status_code'], data['url'], data['headers'], base64.b64decode(data['content']))
+
+def http_request(method, url, max_bytes=None, **kwargs):
+    """
+    Équivalent de requests.request passant par la couche d'enregistrement/rejeu
+    Les en-têtes ne font pas partie de la clé de cassette (ils peuvent contenir des jetons d'API)
+    Avec max_bytes, le corps est lu en flux et l'appel lève ValueError dès qu'il dépasse cette taille:
+    rien de plus n'est téléchargé ni enregistré dans la cassette
+    """
+    def live_call():
+        import requests
+        if max_bytes is None:
+            return requests.request(method, url, **kwargs)
+
+        with requests.request(method, url, stream=True, **kwargs) as response:
+            declared = response.headers.get('Content-Length', '')
+            if declared.isdigit() and int(declared) > max_bytes:
+                raise ValueError(f"Réponse trop volumineuse ({int(declared)} octets, maximum {max_bytes})")
+            content = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                content.extend(chunk)
+                if len(content) > max_bytes:
+                    raise ValueError(f"Réponse trop volumineuse (plus de {max_bytes} octets)")
+            return RecordedResponse(response.status_code, response.url, dict(response.headers), bytes(content))
+
+    request = {'method': method, 'url': url, 'params': kwargs.get('params'), 'json': kwargs.get('json'), 'data': kwargs.get('data')}
+    if max_bytes is not None:
+        request['max_bytes'] = max_bytes
+    return recorded_call("http", request, live_call, _serialize_http_response, _deserialize_http_response)
+
+def http_get(url, **kwargs):
+    return http_request("GET", url, **kwargs)
+
+def http_post(url, **kwargs):
+    return http_request("POST", url, **kwargs)
+
+def chat_completion(client_factory, **kwargs):
+    """
+    Complétion de chat (client.chat.completions.create) passant par la couche d'enregistrement/rejeu
+    Retourne le contenu texte du premier choix; le client n'est créé que pour un appel réel
+    """
+    def live_call():
+        response = client_factory().chat.completions.create(**kwargs)
+        return response.choices[0].message.content
+
+    return recorded_call("chat", kwargs, live_call)
+
+def image_generation(client_factory, **kwargs):
+    """
+    Génération d'image (client.images.generate) passant par la couche d'enregistrement/rejeu
+    Retourne l'image encodée en base64; le client n'est créé que pour un appel réel
+    """
+    def live_call():
+        response = client_factory().images.generate(**kwargs)
+        return response.data[0].b64_json
+
+    return recorded_call("image", kwargs, live_call)
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Service HTTP/JSON longue durée: les jobs sont placés dans une file en mémoire et traités
+# par un pool de workers qui réutilisent les clients OpenAI/Azure et les modules déjà importés
+#
+# Routes:
+#   POST /jobs                 {"url": ..., "command": "extract|analyze|generate", "output": "client-a",
+#                               "draft": false, "select": "all"}
+#   GET  /jobs                 liste des jobs et de leur statut
+#   GET  /jobs/<id>            statut d'un job
+#   GET  /jobs/<id>/events     événements de progression en flux JSON-lines jusqu'à la fin du job
+#   GET  /jobs/<id>/result     résultat d'un job terminé
+#   GET  /health               état du service
+#
+# "output" est un sous-dossier de la racine de sortie du service (--output-root): un client ne peut
+# pas écrire ailleurs. Les jobs terminés sont conservés `job_ttl` secondes, et au plus
+# `max_finished_jobs` à la fois, avant d'être oubliés avec leurs événements et leur résultat.
+
+COMMANDS = ("extract", "analyze", "generate")
+TRUE_VALUES = ("true", "1", "yes", "oui")
+FALSE_VALUES = ("false", "0", "no", "non", "")
+
+def parse_bool(value):
+    """
+    Interprète un booléen JSON ou sa forme texte ("false" est faux); lève ValueError sinon
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in TRUE_VALUES + FALSE_VALUES:
+        return value.strip().lower() in TRUE_VALUES
+    raise ValueError(f"Valeur booléenne invalide: {value!r}")
+
+def resolve_output_folder(output_root, output):
+    """
+    Chemin du dossier de sortie demandé par un client, qui doit rester sous output_root
+    Lève ValueError pour un chemin qui n'est pas une chaîne, absolu ou qui sort de la racine (../)
+    """
+    if output is not None and not isinstance(output, str):
+        raise ValueError(f"Dossier de sortie invalide: {output!r} (chaîne attendue)")
+    root = os.path.realpath(output_root)
+    folder = os.path.realpath(os.path.join(root, output or "."))
+    if os.path.isabs(output or "") or os.path.commonpath([root, folder]) != root:
+        raise ValueError(f"Dossier de sortie non autorisé: {output} (doit être un sous-dossier de {output_root})")
+    return folder
+
+class Job:
+    """
+    Job de traitement d'un site avec ses événements de progression et son résultat
+    """
+
+    def __init__(self, url, command="generate", output_folder="images", draft=False, select="all"):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.command = command
+        self.output_folder = output_folder
+        self.draft = draft
+        self.select = select
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.condition = threading.Condition()
+
+    def add_event(self, event):
+        """
+        Ajoute un événement et réveille les clients qui suivent le flux du job
+        """
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def set_status(self, status, **data):
+        """
+        Change le statut du job et publie l'événement correspondant
+        Les deux sont faits sous le même verrou: un client qui voit le job terminé a aussi reçu son dernier événement
+        """
+        event = {'stage': 'status', 'status': status, 'time': time.time()}
+        event.update(data)
+        with self.condition:
+            self.status = status
+            if status == "running":
+                self.started_at = time.time()
+            elif status in ("done", "failed"):
+                self.finished_at = time.time()
+            self.events.append(event)
+            self.condition.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def summary(self):
+        """
+        Retourne le statut du job sous forme de dictionnaire sérialisable
+        """
+        return {
+            'id': self.id,
+            'url': self.url,
+            'command': self.command,
+            'draft': self.draft,
+            'status': self.status,
+            'error': self.error,
+            'events': len(self.events),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class JobQueue:
+    """
+    File de jobs en mémoire traitée par un pool de threads workers
+    Les jobs terminés sont oubliés après job_ttl secondes ou au-delà de max_finished_jobs
+    """
+
+    def __init__(self, workers=None, job_ttl=3600, max_finished_jobs=100):
+        self.workers = workers or os.cpu_count() or 1
+        self.job_ttl = job_ttl
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        """
+        Démarre les workers
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"worker-{i + 1}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, url, command="generate", output_folder="images", draft=False, select="all"):
+        """
+        Ajoute un job à la file et le retourne
+        """
+        job = Job(url, command, output_folder, draft, select)
+        with self.lock:
+            self._evict()
+            self.jobs[job.id] = job
+        job.set_status("queued")
+        self.pending.put(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            self._evict()
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            self._evict()
+            return list(self.jobs.values())
+
+    def _evict(self):
+        """
+        Oublie les jobs terminés expirés, puis les plus anciens au-delà de la limite (verrou déjà pris)
+        """
+        now = time.time()
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished_at)
+        expired = [job for job in finished if now - job.finished_at > self.job_ttl]
+        excess = finished[len(expired):][:max(0, len(finished) - len(expired) - self.max_finished_jobs)]
+        for job in expired + excess:
+            del self.jobs[job.id]
+
+    def _worker(self):
+        """
+        Boucle d'un worker: exécute les jobs de la file les uns après les autres
+        """
+        from pipeline import run_job
+
+        while True:
+            job = self.pending.get()
+            job.set_status("running")
+            try:
+                job.result = run_job(job.url, job.command, job.output_folder, job.add_event, job.draft, job.select).to_dict()
+                job.set_status("done")
+            except Exception as e:
+                print(f"Erreur lors du traitement du job {job.id}: {e}")
+                job.error = str(e)
+                job.set_status("failed", error=job.error)
+            finally:
+                self.pending.task_done()
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    Gestionnaire HTTP du service: traduit les routes en opérations sur la file de jobs
+    """
+
+    job_queue = None
+    output_root = "images"
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _get_job(self, job_id):
+        job = self.job_queue.get(job_id)
+        if not job:
+            self._send_json(404, {'error': f"Job inconnu: {job_id}"})
+        return job
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {'error': f"Route inconnue: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': f"Corps JSON invalide: {e}"})
+            return
+
+        if not isinstance(payload, dict):
+            self._send_json(400, {'error': "Le corps doit être un objet JSON"})
+            return
+
+        url = payload.get("url")
+        command = payload.get("command", "generate")
+        output = payload.get("output")
+        if not url or not isinstance(url, str):
+            self._send_json(400, {'error': "Le champ 'url' est obligatoire et doit être une chaîne"})
+            return
+        if not isinstance(command, str) or command not in COMMANDS:
+            self._send_json(400, {'error': f"Commande inconnue: {command} (attendu: {', '.join(COMMANDS)})"})
+            return
+
+        try:
+            output_folder = resolve_output_folder(self.output_root, output)
+            draft = parse_bool(payload.get("draft", False))
+            select = payload.get("select")
+            if select is None:
+                select = "all"
+            if draft:
+                from pipeline import parse_selection
+                parse_selection(select)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        job = self.job_queue.submit(url, command, output_folder, draft, select)
+        self._send_json(202, job.summary())
+
+    def do_GET(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+
+        if parts == ["health"]:
+            from circuit_breaker import health_snapshot
+            self._send_json(200, {'status': 'ok', 'workers': self.job_queue.workers, 'pending': self.job_queue.pending.qsize(), 'endpoints': health_snapshot()})
+        elif parts == ["jobs"]:
+            self._send_json(200, [job.summary() for job in self.job_queue.list()])
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self._get_job(parts[1])
+            if job:
+                self._send_json(200, job.summary())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+            job = self._get_job(parts[1])
+            if job and not job.finished:
+                self._send_json(409, {'error': "Le job n'est pas terminé", 'status': job.status})
+            elif job:
+                self._send_json(200, {'id': job.id, 'status': job.status, 'error': job.error, 'result': job.result})
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            job = self._get_job(parts[1])
+            if job:
+                self._stream_events(job)
+        else:
+            self._send_json(404, {'error': f"Route inconnue: {self.path}"})
+
+    def _stream_events(self, job):
+        """
+        Envoie les événements du job en JSON-lines au fur et à mesure, jusqu'à la fin du job
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        sent = 0
+        while True:
+            with job.condition:
+                while sent >= len(job.events) and not job.finished:
+                    job.condition.wait(timeout=15)
+                events = job.events[sent:]
+                finished = job.finished
+            for event in events:
+                self.wfile.write((json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            sent += len(events)
+            if finished and sent >= len(job.events):
+                break
+
+    def log_message(self, format, *args):
+        print(f"[service] {self.address_string()} - {format % args}")
+
+def serve(host="127.0.0.1", port=8080, workers=None, output_root="images", job_ttl=3600, max_finished_jobs=100):
+    """
+    Démarre le service HTTP et le pool de workers jusqu'à interruption (Ctrl+C)
+    """
+    job_queue = JobQueue(workers, job_ttl, max_finished_jobs)
+    job_queue.start()
+
+    handler = type("BoundServiceRequestHandler", (ServiceRequestHandler,), {'job_queue': job_queue, 'output_root': output_root})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Service démarré sur http://{host}:{port} avec {job_queue.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nArrêt du service...")
+    finally:
+        server.server_close()
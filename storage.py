@@ -0,0 +1,202 @@
+import os
+import glob
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Stockage adressé par contenu des images générées et des logos
+#
+# Chaque fichier est rangé sous <racine>/<2 premiers caractères>/<2 suivants>/<sha256>.<extension>:
+# les répertoires restent petits même avec des centaines de milliers de fichiers, et un même contenu
+# n'est écrit qu'une fois. L'index SQLite <racine>/index.sqlite associe chaque fichier au site,
+# à l'axe, au prompt et à la qualité qui l'ont produit.
+# Les écritures sont atomiques (fichier temporaire puis renommage): un fichier présent est toujours complet.
+# Réenregistrer un contenu déjà indexé avec les mêmes informations ne crée pas de nouvelle ligne:
+# seule sa date est mise à jour.
+
+INDEX_FILENAME = "index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hash TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    site TEXT,
+    axis TEXT,
+    prompt TEXT,
+    quality TEXT,
+    source_url TEXT,
+    path TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_hash ON assets (hash);
+CREATE INDEX IF NOT EXISTS assets_site_kind ON assets (site, kind);
+CREATE INDEX IF NOT EXISTS assets_site_axis_prompt ON assets (site, axis, prompt);
+"""
+
+class AssetStore:
+    """
+    Stockage adressé par contenu avec index SQLite
+    """
+
+    def __init__(self, root, create=True):
+        """
+        create=False ouvre un stockage existant sans créer le dossier ni l'index (utilisé par gc)
+        """
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self.lock = threading.Lock()
+        if create:
+            os.makedirs(root, exist_ok=True)
+            with self._connect() as conn:
+                conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self, readonly=False):
+        # Une connexion par opération: l'index peut être utilisé depuis plusieurs threads
+        if readonly:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.index_path)}?mode=ro", uri=True, timeout=30)
+        else:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def path_for(self, digest, extension):
+        """
+        Chemin d'un fichier à partir de son empreinte SHA-256
+        """
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.{extension}")
+
+    def _write(self, path, data):
+        """
+        Écrit un fichier de façon atomique (fichier temporaire puis renommage)
+        """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put(self, data, kind, extension="png", site=None, axis=None, prompt=None, quality=None, source_url=None):
+        """
+        Enregistre un contenu (écriture atomique, ignorée s'il est déjà présent) et l'indexe
+        Une ligne identique déjà présente dans l'index est réutilisée (sa date est mise à jour)
+        Retourne le chemin du fichier
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, extension)
+        relative_path = os.path.relpath(path, self.root)
+
+        if os.path.exists(path):
+            # Rajeunir le fichier: gc ne supprime que des orphelins anciens
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+        if not os.path.exists(path):
+            self._write(path, data)
+
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE assets SET created_at = ? WHERE hash = ? AND kind = ? AND site IS ? AND axis IS ? AND prompt IS ? AND quality IS ? AND source_url IS ? AND path = ?",
+                (now, digest, kind, site, axis, prompt, quality, source_url, relative_path)
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    "INSERT INTO assets (hash, kind, site, axis, prompt, quality, source_url, path, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (digest, kind, site, axis, prompt, quality, source_url, relative_path, now)
+                )
+
+        # Un gc concurrent a pu supprimer le fichier orphelin avant que sa ligne soit indexée
+        if not os.path.exists(path):
+            self._write(path, data)
+        return path
+
+    def find(self, kind=None, site=None, axis=None, prompt=None, quality=None):
+        """
+        Recherche les fichiers indexés correspondant aux critères, du plus récent au plus ancien
+        """
+        criteria = {'kind': kind, 'site': site, 'axis': axis, 'prompt': prompt, 'quality': quality}
+        clauses = [f"{column} = ?" for column, value in criteria.items() if value is not None]
+        values = [value for value in criteria.values() if value is not None]
+        query = "SELECT * FROM assets"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created_at DESC"
+
+        with self._connect() as conn:
+            rows = conn.execute(query, values).fetchall()
+        return [dict(row, path=os.path.join(self.root, row['path'])) for row in rows]
+
+    def _is_indexed(self, relative_path):
+        if not os.path.exists(self.index_path):
+            return False
+        with self._connect(readonly=True) as conn:
+            return conn.execute("SELECT 1 FROM assets WHERE path = ? LIMIT 1", (relative_path,)).fetchone() is not None
+
+    def gc(self, dry_run=False, min_age=3600):
+        """
+        Supprime les fichiers orphelins:
+        - fichiers du stockage absents de l'index et fichiers temporaires d'écritures interrompues
+        - images brutes (_raw.png) laissées à la racine par l'ancien nommage à plat
+        Les fichiers modifiés depuis moins de min_age secondes sont conservés (écritures en cours)
+        L'index n'est lu qu'en lecture seule et rien n'est créé si le dossier ou l'index n'existe pas;
+        sans index, seules les images brutes de la racine sont supprimées
+        Retourne la liste des fichiers supprimés (ou à supprimer avec dry_run=True)
+        """
+        if not os.path.isdir(self.root):
+            return []
+
+        stored = glob.glob(os.path.join(self.root, "??", "??", "*"))
+        if os.path.exists(self.index_path):
+            with self._connect(readonly=True) as conn:
+                indexed = {row['path'] for row in conn.execute("SELECT DISTINCT path FROM assets")}
+            candidates = [path for path in stored if os.path.relpath(path, self.root) not in indexed]
+        else:
+            # Sans index, rien ne distingue un orphelin d'un fichier référencé: le stockage n'est pas touché
+            candidates = []
+            if stored:
+                print(f"Attention: index {self.index_path} introuvable, {len(stored)} fichier(s) du stockage conservé(s)")
+        candidates.extend(glob.glob(os.path.join(self.root, "*_raw.png")))
+
+        orphans = []
+        for path in candidates:
+            # Vérifications refaites juste avant la suppression: un put concurrent a pu réutiliser le fichier
+            try:
+                if time.time() - os.path.getmtime(path) < min_age:
+                    continue
+                if self._is_indexed(os.path.relpath(path, self.root)):
+                    continue
+                if not dry_run:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+            orphans.append(path)
+        return orphans
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(root):
+    """
+    Retourne le stockage partagé d'un dossier racine (créé au premier appel)
+    """
+    with _stores_lock:
+        key = os.path.abspath(root)
+        if key not in _stores:
+            _stores[key] = AssetStore(root)
+        return _stores[key]
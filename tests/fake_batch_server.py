@@ -0,0 +1,195 @@
+import re
+import json
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Faux serveur local de l'API batch compatible OpenAI (fichiers et lots), sans réseau ni clé d'API
+#
+# Routes (préfixe /v1, à passer en base_url au client OpenAI ou à batch-analyze --base-url):
+#   POST /v1/files                 envoi du fichier JSONL des requêtes (multipart)
+#   POST /v1/batches               création du lot: les réponses sont calculées immédiatement
+#   GET  /v1/batches/<id>          état du lot: en cours pendant `pending_polls` interrogations
+#   GET  /v1/files/<id>/content    contenu des fichiers de résultats et d'erreurs
+#
+# Les `poll_errors` premières interrogations de l'état du lot répondent 503 (erreur passagère).
+#
+#   python tests/fake_batch_server.py --port 8799
+#   python main.py batch-analyze --input sites.txt --base-url http://127.0.0.1:8799/v1
+
+DEFAULT_AXES = "Conseil\nFormation\nAudit\nSupport"
+
+def completion_line(custom_id, content):
+    """
+    Ligne de résultat d'une requête réussie, au format de l'API batch
+    """
+    return json.dumps({
+        'id': f"response-{custom_id}",
+        'custom_id': custom_id,
+        'response': {'status_code': 200, 'body': {'choices': [{'index': 0, 'message': {'role': "assistant", 'content': content}}]}},
+        'error': None
+    }, ensure_ascii=False)
+
+def answer_all(requests):
+    """
+    Réponses par défaut: les mêmes axes pour chaque requête, sans fichier d'erreurs
+    """
+    return "\n".join(completion_line(request['custom_id'], DEFAULT_AXES) for request in requests), None
+
+class FakeBatchServer:
+    """
+    Faux serveur batch démarré dans un thread; `respond(requests)` retourne le texte des fichiers
+    de résultats et d'erreurs (None si absent) à partir des requêtes du fichier envoyé
+    """
+
+    def __init__(self, respond=answer_all, pending_polls=1, poll_errors=0, host="127.0.0.1", port=0):
+        self.respond = respond
+        self.pending_polls = pending_polls
+        self.poll_errors = poll_errors
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+        handler = type("BoundFakeBatchHandler", (FakeBatchHandler,), {'fake': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def add_file(self, content, filename, purpose):
+        with self.lock:
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = content
+        return {'id': file_id, 'object': "file", 'bytes': len(content), 'created_at': 0, 'filename': filename, 'purpose': purpose, 'status': "processed"}
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        requests = [json.loads(line) for line in self.files[input_file_id].decode("utf-8").splitlines() if line.strip()]
+        output_text, error_text = self.respond(requests)
+        with self.lock:
+            batch_id = f"batch-{len(self.batches) + 1}"
+            batch = {
+                'id': batch_id,
+                'object': "batch",
+                'endpoint': endpoint,
+                'input_file_id': input_file_id,
+                'completion_window': completion_window,
+                'created_at': 0,
+                'status': "validating",
+                'output_file_id': None,
+                'error_file_id': None,
+                'request_counts': {'total': len(requests), 'completed': 0, 'failed': 0},
+                'polls': 0
+            }
+            if output_text:
+                batch['output_file_id'] = f"{batch_id}-output"
+                self.files[batch['output_file_id']] = output_text.encode("utf-8")
+            if error_text:
+                batch['error_file_id'] = f"{batch_id}-errors"
+                self.files[batch['error_file_id']] = error_text.encode("utf-8")
+            batch['results'] = tuple(sum(1 for line in (text or "").splitlines() if line.strip()) for text in (output_text, error_text))
+            self.batches[batch_id] = batch
+        return self.public_batch(batch, "validating")
+
+    def poll_batch(self, batch_id):
+        """
+        Retourne l'état du lot, ou None pour une erreur passagère simulée
+        """
+        with self.lock:
+            if self.poll_errors:
+                self.poll_errors -= 1
+                return None
+            batch = self.batches[batch_id]
+            batch['polls'] += 1
+            if batch['polls'] <= self.pending_polls:
+                return self.public_batch(batch, "in_progress")
+            return self.public_batch(batch, "completed")
+
+    @staticmethod
+    def public_batch(batch, status):
+        public = {key: value for key, value in batch.items() if key not in ("polls", "results")}
+        public['status'] = status
+        if status != "completed":
+            public['output_file_id'] = public['error_file_id'] = None
+        else:
+            completed, failed = batch['results']
+            public['request_counts'] = {'total': batch['request_counts']['total'], 'completed': completed, 'failed': failed}
+        return public
+
+class FakeBatchHandler(BaseHTTPRequestHandler):
+    fake = None
+
+    def _send(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/v1/files":
+            # Corps multipart: relu comme un message MIME pour retrouver le champ « file »
+            message = BytesParser(policy=default_policy).parsebytes(b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + body)
+            fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+            if "file" not in fields:
+                self._send(400, {'error': {'message': "Champ 'file' manquant"}})
+                return
+            purpose = fields["purpose"].get_content() if "purpose" in fields else "batch"
+            self._send(200, self.fake.add_file(fields["file"].get_payload(decode=True), fields["file"].get_filename(), purpose))
+        elif self.path == "/v1/batches":
+            request = json.loads(body)
+            if request.get('input_file_id') not in self.fake.files:
+                self._send(404, {'error': {'message': f"Fichier inconnu: {request.get('input_file_id')}"}})
+                return
+            self._send(200, self.fake.create_batch(request['input_file_id'], request.get('endpoint'), request.get('completion_window')))
+        else:
+            self._send(404, {'error': {'message': f"Route inconnue: {self.path}"}})
+
+    def do_GET(self):
+        batch_match = re.fullmatch(r"/v1/batches/([^/]+)", self.path)
+        content_match = re.fullmatch(r"/v1/files/([^/]+)/content", self.path)
+        if batch_match and batch_match.group(1) in self.fake.batches:
+            batch = self.fake.poll_batch(batch_match.group(1))
+            if batch is None:
+                self._send(503, {'error': {'message': "Service temporairement indisponible"}})
+            else:
+                self._send(200, batch)
+        elif content_match and content_match.group(1) in self.fake.files:
+            self._send(200, self.fake.files[content_match.group(1)], "application/octet-stream")
+        else:
+            self._send(404, {'error': {'message': f"Route inconnue: {self.path}"}})
+
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Faux serveur local de l'API batch compatible OpenAI")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8799, help="Port d'écoute")
+    parser.add_argument("--pending-polls", type=int, default=1, help="Nombre d'interrogations pendant lesquelles un lot reste en cours")
+    args = parser.parse_args()
+
+    server = FakeBatchServer(pending_polls=args.pending_polls, host=args.host, port=args.port)
+    print(f"Faux serveur batch sur {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_analyzer
+from fake_batch_server import FakeBatchServer, completion_line
+
+CONTENT = "Contenu du site " * 20
+
+def completion(custom_id, content):
+    return json.dumps({'custom_id': custom_id, 'response': {'status_code': 200, 'body': {'choices': [{'message': {'content': content}}]}}, 'error': None})
+
+class FakeBatchTransport:
+    """
+    Faux transport batch en mémoire: le lot reste en cours pendant `pending_polls` interrogations,
+    `poll_errors` interrogations échouent d'abord, puis les réponses sont produites par `respond`
+    """
+
+    def __init__(self, respond, pending_polls=1, poll_errors=0):
+        self.respond = respond
+        self.pending_polls = pending_polls
+        self.poll_errors = poll_errors
+        self.requests = None
+        self.polls = 0
+        self.files = {}
+
+    def upload(self, path):
+        with open(path, encoding="utf-8") as f:
+            self.requests = [json.loads(line) for line in f]
+        return "file-input"
+
+    def create_batch(self, input_file_id):
+        assert input_file_id == "file-input"
+        output_text, error_text = self.respond(self.requests)
+        self.files = {'file-output': output_text, 'file-errors': error_text}
+        return "batch-1"
+
+    def get_batch(self, batch_id):
+        self.polls += 1
+        if self.poll_errors:
+            self.poll_errors -= 1
+            raise ConnectionError("réseau indisponible")
+        if self.polls <= self.pending_polls:
+            return {'id': batch_id, 'status': "in_progress", 'request_counts': {'total': len(self.requests), 'completed': 0}}
+        return {
+            'id': batch_id,
+            'status': "completed",
+            'output_file_id': "file-output" if self.files['file-output'] else None,
+            'error_file_id': "file-errors" if self.files['file-errors'] else None,
+            'request_counts': {'total': len(self.requests), 'completed': len(self.requests)}
+        }
+
+    def download(self, file_id):
+        return self.files[file_id]
+
+class AnalyzeSitesInBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+        self.sites = ["https://a.fr/", "https://b.fr/", "https://c.fr/", "https://d.fr/"]
+        contents = {site: CONTENT for site in self.sites}
+        contents["https://d.fr/"] = "trop court"
+        patches = [
+            mock.patch.object(batch_analyzer, "resolve_sites", lambda sites, max_workers=4: {site: site for site in sites}),
+            mock.patch.object(batch_analyzer, "extract_contents", lambda sites, max_workers=4: {site: contents[site] for site in sites}),
+            mock.patch("time.sleep"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def analyze(self, transport):
+        return batch_analyzer.analyze_sites_in_batch(self.sites, transport, poll_interval=0, work_dir=self.work_dir)
+
+    def test_results_are_mapped_back_by_custom_id(self):
+        def respond(requests):
+            self.assertEqual(len(requests), 3)
+            for request in requests:
+                self.assertEqual(request['method'], "POST")
+                self.assertEqual(request['url'], "/chat/completions")
+            self.assertEqual({request['custom_id'] for request in requests}, {"site-1", "site-2", "site-3"})
+            # Réponses dans le désordre, une ligne illisible, une erreur et une réponse manquante (site-3)
+            output = "\n".join([completion("site-2", "Formation\nAudit"), "{illisible", completion("site-1", "Conseil\nSupport\nVente\nLocation\nExtra")])
+            errors = json.dumps({'custom_id': "site-3", 'response': {'status_code': 429, 'body': {'error': "quota"}}, 'error': None})
+            return output, errors
+
+        transport = FakeBatchTransport(respond, pending_polls=2)
+        results = self.analyze(transport)
+
+        self.assertEqual(list(results), self.sites)
+        self.assertEqual(results["https://a.fr/"], ["Conseil", "Support", "Vente", "Location"])
+        self.assertEqual(results["https://b.fr/"], ["Formation", "Audit"])
+        self.assertTrue(results["https://c.fr/"][0].startswith("Erreur d'analyse"))
+        self.assertEqual(results["https://d.fr/"], ["Échec de l'extraction du contenu suffisant"])
+        self.assertEqual(transport.polls, 3)
+
+    def test_missing_answers_are_reported(self):
+        transport = FakeBatchTransport(lambda requests: (completion("site-1", "Conseil"), None), pending_polls=0)
+        results = self.analyze(transport)
+
+        self.assertEqual(results["https://a.fr/"], ["Conseil"])
+        self.assertEqual(results["https://b.fr/"], ["Erreur d'analyse: aucune réponse dans le lot"])
+        self.assertEqual(results["https://c.fr/"], ["Erreur d'analyse: aucune réponse dans le lot"])
+
+    def test_transient_poll_errors_are_retried(self):
+        transport = FakeBatchTransport(lambda requests: (completion("site-1", "Conseil"), None), pending_polls=0, poll_errors=2)
+        results = self.analyze(transport)
+
+        self.assertEqual(results["https://a.fr/"], ["Conseil"])
+        self.assertEqual(transport.polls, 3)
+
+    def test_persistent_poll_errors_abort(self):
+        transport = FakeBatchTransport(lambda requests: ("", None), poll_errors=batch_analyzer.MAX_POLL_ERRORS)
+        with self.assertRaises(ConnectionError):
+            self.analyze(transport)
+
+    def test_invalid_urls_are_reported(self):
+        self.sites.append("exemple.fr:abc")
+        transport = FakeBatchTransport(lambda requests: (completion("site-1", "Conseil"), None), pending_polls=0)
+        results = self.analyze(transport)
+
+        self.assertEqual(results["https://a.fr/"], ["Conseil"])
+        self.assertEqual(results["exemple.fr:abc"], ["Erreur d'analyse: URL invalide"])
+
+class OpenAIBatchTransportTest(unittest.TestCase):
+    """
+    Transport réel (client OpenAI) face au faux serveur batch local
+    """
+
+    def setUp(self):
+        try:
+            from openai import OpenAI
+        except ImportError:
+            self.skipTest("openai n'est pas installé")
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+        self.client_factory = lambda: OpenAI(base_url=self.server.url, api_key="test", max_retries=0)
+        self.sites = ["https://a.fr/", "https://b.fr/", "https://c.fr/"]
+        patches = [
+            mock.patch.object(batch_analyzer, "resolve_sites", lambda sites, max_workers=4: {site: site for site in sites}),
+            mock.patch.object(batch_analyzer, "extract_contents", lambda sites, max_workers=4: {site: CONTENT for site in sites}),
+            mock.patch("time.sleep"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def start_server(self, respond, **kwargs):
+        self.server = FakeBatchServer(respond, **kwargs).start()
+        self.addCleanup(self.server.stop)
+        return batch_analyzer.OpenAIBatchTransport(self.client_factory)
+
+    def test_batch_round_trip(self):
+        def respond(requests):
+            self.assertEqual([request['custom_id'] for request in requests], ["site-1", "site-2", "site-3"])
+            self.assertEqual(requests[0]['body']['messages'][0]['role'], "system")
+            output = "\n".join([completion_line("site-3", "Vente"), completion_line("site-1", "Conseil\nAudit")])
+            errors = json.dumps({'custom_id': "site-2", 'response': {'status_code': 500, 'body': {'error': "panne"}}, 'error': None})
+            return output, errors
+
+        transport = self.start_server(respond, pending_polls=2)
+        results = batch_analyzer.analyze_sites_in_batch(self.sites, transport, poll_interval=0, work_dir=self.work_dir)
+
+        self.assertEqual(results["https://a.fr/"], ["Conseil", "Audit"])
+        self.assertTrue(results["https://b.fr/"][0].startswith("Erreur d'analyse"))
+        self.assertEqual(results["https://c.fr/"], ["Vente"])
+
+        batch = transport.get_batch("batch-1")
+        self.assertEqual(batch['status'], "completed")
+        self.assertEqual(batch['request_counts'], {'total': 3, 'completed': 2, 'failed': 1})
+        self.assertEqual((batch['output_file_id'], batch['error_file_id']), ("batch-1-output", "batch-1-errors"))
+
+    def test_server_errors_while_polling_are_retried(self):
+        transport = self.start_server(lambda requests: (completion_line("site-1", "Conseil"), None), pending_polls=0, poll_errors=2)
+        results = batch_analyzer.analyze_sites_in_batch(self.sites, transport, poll_interval=0, work_dir=self.work_dir)
+
+        self.assertEqual(results["https://a.fr/"], ["Conseil"])
+        self.assertEqual(results["https://b.fr/"], ["Erreur d'analyse: aucune réponse dans le lot"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import circuit_breaker
+from circuit_breaker import EndpointHealth, CLOSED, OPEN, HALF_OPEN
+
+class Clock:
+    """
+    Horloge monotone contrôlée par le test
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class EndpointHealthStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patch = mock.patch.object(circuit_breaker.time, "monotonic", self.clock)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.health = EndpointHealth("api", failure_threshold=3, recovery_timeout=60.0)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.assertTrue(self.health.allow_request())
+            self.health.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.health.record_failure()
+        self.health.record_failure()
+        self.assertEqual(self.health.state, CLOSED)
+        self.health.record_failure()
+        self.assertEqual(self.health.state, OPEN)
+        self.assertFalse(self.health.allow_request())
+        self.assertFalse(self.health.is_available())
+        self.assertEqual(self.health.total_rejected, 1)
+
+    def test_success_resets_the_failure_count(self):
+        self.health.record_failure()
+        self.health.record_failure()
+        self.health.record_success(0.1)
+        self.health.record_failure()
+        self.assertEqual(self.health.state, CLOSED)
+        self.assertEqual(self.health.consecutive_failures, 1)
+
+    def test_half_open_allows_a_single_probe(self):
+        self.open_breaker()
+        self.clock.now += 59
+        self.assertFalse(self.health.allow_request())
+        self.clock.now += 1
+        self.assertTrue(self.health.is_available())
+        self.assertTrue(self.health.allow_request())
+        self.assertEqual(self.health.state, HALF_OPEN)
+        self.assertFalse(self.health.allow_request())
+        self.assertFalse(self.health.is_available())
+
+    def test_successful_probe_closes(self):
+        self.open_breaker()
+        self.clock.now += 60
+        self.assertTrue(self.health.allow_request())
+        self.health.record_success(0.2)
+        self.assertEqual(self.health.state, CLOSED)
+        self.assertTrue(self.health.allow_request())
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.clock.now += 60
+        self.assertTrue(self.health.allow_request())
+        self.health.record_failure()
+        self.assertEqual(self.health.state, OPEN)
+        self.assertFalse(self.health.allow_request())
+        # Le délai de récupération repart de l'échec de la requête de test
+        self.clock.now += 59
+        self.assertFalse(self.health.allow_request())
+        self.clock.now += 1
+        self.assertTrue(self.health.allow_request())
+
+    def test_cancelled_probe_frees_the_slot(self):
+        self.open_breaker()
+        self.clock.now += 60
+        self.assertTrue(self.health.allow_request())
+        self.health.cancel_request()
+        self.assertEqual(self.health.state, HALF_OPEN)
+        self.assertTrue(self.health.allow_request())
+
+class AdaptiveTimeoutTest(unittest.TestCase):
+
+    def test_max_timeout_until_enough_samples(self):
+        health = EndpointHealth("api", min_timeout=5.0, max_timeout=30.0, min_samples=5)
+        for _ in range(4):
+            health.record_success(1.0)
+        self.assertEqual(health.current_timeout(), 30.0)
+        health.record_success(1.0)
+        self.assertEqual(health.current_timeout(), 5.0)
+
+    def test_follows_the_latency_percentile(self):
+        health = EndpointHealth("api", min_timeout=1.0, max_timeout=30.0, timeout_percentile=95, timeout_margin=2.0, min_samples=5)
+        for latency in [1.0] * 19 + [4.0]:
+            health.record_success(latency)
+        self.assertEqual(health.latency_percentile(50), 1.0)
+        self.assertEqual(health.latency_percentile(95), 1.0)
+        self.assertEqual(health.current_timeout(), 2.0)
+        health.record_success(4.0)
+        self.assertEqual(health.latency_percentile(95), 4.0)
+        self.assertEqual(health.current_timeout(), 8.0)
+
+    def test_bounded_by_min_and_max(self):
+        fast = EndpointHealth("api", min_timeout=5.0, max_timeout=30.0, min_samples=1)
+        fast.record_success(0.01)
+        self.assertEqual(fast.current_timeout(), 5.0)
+        slow = EndpointHealth("api", min_timeout=5.0, max_timeout=30.0, min_samples=1)
+        slow.record_success(60.0)
+        self.assertEqual(slow.current_timeout(), 30.0)
+
+    def test_window_forgets_old_latencies(self):
+        health = EndpointHealth("api", min_timeout=1.0, max_timeout=30.0, window=5, min_samples=5)
+        for _ in range(5):
+            health.record_success(10.0)
+        for _ in range(5):
+            health.record_success(1.0)
+        self.assertEqual(health.current_timeout(), 2.0)
+
+    def test_failures_and_client_errors_do_not_feed_latencies(self):
+        health = EndpointHealth("api", min_samples=1)
+        health.record_failure()
+        health.record_success()
+        self.assertEqual(len(health.latencies), 0)
+
+class MarkdownApiHealthTest(unittest.TestCase):
+    """
+    Seuls les délais expirés, les connexions impossibles et les erreurs 5xx comptent contre l'API
+    """
+
+    def setUp(self):
+        import html_to_markdown
+
+        self.module = html_to_markdown
+        self.health = EndpointHealth("markdown", failure_threshold=3, recovery_timeout=60.0)
+        patches = [
+            mock.patch.object(html_to_markdown, "_api_health", self.health),
+            mock.patch.object(html_to_markdown, "init_html_to_markdown_api", lambda: "jeton"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def convert_with(self, error):
+        with mock.patch.object(self.module, "http_post", side_effect=error):
+            return self.module.convert_html_to_markdown("https://client.fr/")
+
+    def http_error(self, status_code):
+        import requests
+        from recorder import RecordedResponse
+        return requests.HTTPError(f"{status_code} Error", response=RecordedResponse(status_code, "https://api/", {}, b""))
+
+    def test_client_errors_do_not_open_the_breaker(self):
+        for status_code in (401, 404, 422, 400):
+            self.assertIsNone(self.convert_with(self.http_error(status_code)))
+        self.assertEqual(self.health.state, CLOSED)
+        self.assertEqual(self.health.total_failures, 0)
+
+    def test_server_errors_and_timeouts_open_the_breaker(self):
+        import requests
+        self.convert_with(self.http_error(502))
+        self.convert_with(requests.Timeout("délai expiré"))
+        self.convert_with(requests.ConnectionError("connexion refusée"))
+        self.assertEqual(self.health.state, OPEN)
+
+    def test_local_errors_leave_the_state_unchanged(self):
+        self.convert_with(LookupError("aucune cassette"))
+        self.assertEqual(self.health.state, CLOSED)
+        self.assertEqual((self.health.total_failures, self.health.total_successes), (0, 0))
+
+if __name__ == "__main__":
+    unittest.main()
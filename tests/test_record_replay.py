@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Page dont la palette compte plus de 3 couleurs: l'ordre retenu entre dans les prompts d'image
+PAGE = """<html><head><title>Boulangerie Exemple</title>
+<style>body { color: #112233; } h1 { color: #445566; } a { color: #778899; } footer { color: #aabbcc; } nav { color: rgb(204, 221, 238); }</style>
+</head><body><h1>Boulangerie Exemple</h1><p>{text}</p></body></html>""".replace("{text}", "Pains, viennoiseries et pâtisseries artisanales. " * 20)
+
+# Lancé dans un nouveau processus: en enregistrement, les clients OpenAI sont remplacés par des faux
+DRIVER = r"""
+import sys, json, base64
+from io import BytesIO
+from types import SimpleNamespace
+sys.path.insert(0, sys.argv[1])
+import main
+
+if sys.argv[2] == "--record":
+    from PIL import Image
+    import config_azure_openai, enhanced_image_generator
+
+    def create_completion(**kwargs):
+        content = "Boulangerie artisanale\nViennoiseries\nPâtisseries\nTraiteur"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def generate_image(**kwargs):
+        buffer = BytesIO()
+        Image.new("RGB", (64, 64), (len(kwargs['prompt']) % 256, 80, 120)).save(buffer, "PNG")
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=base64.b64encode(buffer.getvalue()).decode("ascii"))])
+
+    config_azure_openai._azure_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create_completion)))
+    enhanced_image_generator._openai_client = SimpleNamespace(images=SimpleNamespace(generate=generate_image))
+
+main.main(["generate", "--yes", "--dns-ttl", "0", "--stream", "results.jsonl"] + sys.argv[2:])
+"""
+
+class SiteHandler(BaseHTTPRequestHandler):
+
+    def do_HEAD(self):
+        self.send_page(False)
+
+    def do_GET(self):
+        self.send_page(True)
+
+    def send_page(self, with_body):
+        body = PAGE.encode("utf-8")
+        if self.path not in ("/", "/index.html"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class RecordReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def run_generate(self, mode, hash_seed):
+        """
+        Exécute generate dans un nouveau processus (graine de hachage imposée) et retourne les résultats du flux
+        """
+        run_dir = os.path.join(self.work_dir, mode)
+        os.makedirs(run_dir)
+        env = {key: value for key, value in os.environ.items() if not key.startswith(("RECORDER_", "OPENAI_", "AZURE_OPENAI_", "HTML_TO_MARKDOWN_"))}
+        env["PYTHONHASHSEED"] = str(hash_seed)
+        cassettes = os.path.join(self.work_dir, "cassettes")
+        completed = subprocess.run(
+            [sys.executable, "-c", DRIVER, ROOT, f"--{mode}", cassettes, "--url", self.url],
+            cwd=run_dir, env=env, capture_output=True, text=True, timeout=120
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        with open(os.path.join(run_dir, "results.jsonl"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_generate_replays_in_a_fresh_process(self):
+        recorded = self.run_generate("record", hash_seed=1)
+        # Le rejeu ne doit plus avoir besoin du site
+        self.server.shutdown()
+        replayed = self.run_generate("replay", hash_seed=2)
+
+        self.assertEqual(len(recorded), 4)
+        self.assertTrue(all(result['path'] for result in recorded))
+        self.assertEqual(
+            [(result['index'], result['prompt'], os.path.basename(result['path'])) for result in sorted(replayed, key=lambda result: result['index'])],
+            [(result['index'], result['prompt'], os.path.basename(result['path'])) for result in sorted(recorded, key=lambda result: result['index'])]
+        )
+        self.assertIn("#112233, #445566, #778899", recorded[0]['prompt'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import time
+import socket
+import threading
+import urllib.parse
+from recorder import http_request
+
+# Normalisation des URL saisies, résolution des redirections et cache DNS
+#
+# Une URL saisie (« Exemple.fr », « http://www.exemple.fr:80/#contact »...) est d'abord normalisée:
+# schéma https par défaut, hôte en minuscules, port par défaut et fragment supprimés. Sa chaîne de
+# redirections (http -> https -> www...) n'est suivie qu'une fois: l'URL finale est mise en cache
+# pendant `ttl` secondes et c'est elle que téléchargent ensuite toutes les étapes d'extraction.
+#
+# enable_dns_cache() remplace socket.getaddrinfo par une version mise en cache, partagée par toutes
+# les connexions du processus (requests, client OpenAI...).
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+REDIRECT_TTL = 3600
+DNS_TTL = 300
+# Nombre maximal d'entrées de chaque cache (mode service: les hôtes s'accumulent sinon indéfiniment)
+REDIRECT_CACHE_SIZE = 10000
+DNS_CACHE_SIZE = 1000
+
+_redirect_cache = {}
+_redirect_lock = threading.Lock()
+
+def _cache_put(cache, key, value, expires, now, max_entries):
+    """
+    Ajoute une entrée à un cache {clé: (valeur, expiration)}, à appeler sous le verrou du cache
+    Les entrées expirées sont supprimées à chaque écriture; au-delà de max_entries, les plus
+    anciennes écritures sont évincées (le dictionnaire conserve l'ordre d'insertion)
+    """
+    for expired in [k for k, (_, expiry) in cache.items() if expiry <= now]:
+        del cache[expired]
+    cache.pop(key, None)
+    cache[key] = (value, expires)
+    while len(cache) > max_entries:
+        del cache[next(iter(cache))]
+
+def canonicalize_url(url, strict=False):
+    """
+    Normalise une URL: https par défaut, schéma et hôte en minuscules, sans port par défaut ni fragment
+    Une URL invalide (port non numérique, hôte absent, IPv6 mal formée) est retournée telle quelle,
+    débarrassée de ses espaces; avec strict=True, elle lève ValueError
+    """
+    url = url.strip()
+    try:
+        return _canonicalize(url)
+    except ValueError:
+        if strict:
+            raise
+        return url
+
+def _canonicalize(url):
+    if "://" not in url:
+        url = "https://" + url.lstrip("/")
+
+    # urlsplit, hostname et port lèvent ValueError pour une URL invalide
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    port = parts.port
+    if not host:
+        raise ValueError(f"URL sans hôte: {url}")
+    if ":" in host:
+        host = f"[{host}]"
+    netloc = host
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+        netloc = f"{userinfo}@{netloc}"
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{port}"
+
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+def _fetch_final_url(url):
+    """
+    Suit les redirections d'une URL; une requête HEAD suffit en général, GET est utilisé si le serveur la refuse
+    """
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    response = http_request("HEAD", url, headers=headers, timeout=20, allow_redirects=True)
+    if response.status_code >= 400:
+        response = http_request("GET", url, headers=headers, timeout=20)
+    response.raise_for_status()
+    return canonicalize_url(response.url)
+
+def resolve_url(url, ttl=REDIRECT_TTL):
+    """
+    Retourne l'URL finale (normalisée) après redirections, mise en cache pendant ttl secondes
+    (REDIRECT_CACHE_SIZE entrées au plus)
+    Sans schéma dans l'URL saisie, http est essayé si https ne répond pas
+    En cas d'erreur, l'URL normalisée est retournée telle quelle (et n'est pas mise en cache)
+    """
+    canonical = canonicalize_url(url)
+    now = time.monotonic()
+    with _redirect_lock:
+        cached = _redirect_cache.get(canonical)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    try:
+        try:
+            final_url = _fetch_final_url(canonical)
+        except Exception:
+            if "://" in url or not canonical.startswith("https://"):
+                raise
+            final_url = _fetch_final_url("http" + canonical[len("https"):])
+    except Exception as e:
+        print(f"Erreur lors de la résolution de l'URL {canonical}: {e}")
+        return canonical
+
+    if final_url != canonical:
+        print(f"Redirection: {canonical} -> {final_url}")
+    with _redirect_lock:
+        _cache_put(_redirect_cache, canonical, final_url, now + ttl, now, REDIRECT_CACHE_SIZE)
+        _cache_put(_redirect_cache, final_url, final_url, now + ttl, now, REDIRECT_CACHE_SIZE)
+    return final_url
+
+def dedup_urls(urls):
+    """
+    Supprime les doublons d'une liste d'URL après normalisation, en conservant l'ordre
+    Les URL invalides sont ignorées avec un avertissement
+    Retourne la liste des URL normalisées
+    """
+    unique = []
+    seen = set()
+    for url in urls:
+        try:
+            canonical = canonicalize_url(url, strict=True)
+        except ValueError as e:
+            print(f"URL invalide ignorée ({url.strip()}): {e}")
+            continue
+        if canonical not in seen:
+            seen.add(canonical)
+            unique.append(canonical)
+    return unique
+
+_dns_cache = {}
+_dns_lock = threading.Lock()
+_original_getaddrinfo = socket.getaddrinfo
+
+def enable_dns_cache(ttl=DNS_TTL):
+    """
+    Met en cache les résolutions DNS (socket.getaddrinfo) pendant ttl secondes pour tout le processus
+    (DNS_CACHE_SIZE entrées au plus); les échecs de résolution ne sont pas mis en cache
+    """
+    def cached_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with _dns_lock:
+            cached = _dns_cache.get(key)
+            if cached and cached[1] > now:
+                return list(cached[0])
+        result = _original_getaddrinfo(host, port, family, type, proto, flags)
+        with _dns_lock:
+            _cache_put(_dns_cache, key, result, now + ttl, now, DNS_CACHE_SIZE)
+        return list(result)
+
+    socket.getaddrinfo = cached_getaddrinfo
+
+def disable_dns_cache():
+    """
+    Rétablit la résolution DNS d'origine et vide le cache
+    """
+    socket.getaddrinfo = _original_getaddrinfo
+    with _dns_lock:
+        _dns_cache.clear()
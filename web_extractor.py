@@ -1,26 +1,37 @@
-import requests
-from bs4 import BeautifulSoup
-import trafilatura
 from config_azure_openai import init_azure_openai, get_deployment_info
-from html_to_markdown import convert_html_to_markdown
+from html_to_markdown import convert_html_to_markdown, markdown_api_available
+from recorder import http_get, chat_completion
+from profiling import profile_stage, profiled_stage
 
+# Les dépendances lourdes (trafilatura, bs4) sont importées à l'intérieur
+# des fonctions qui les utilisent pour garder un démarrage rapide de la CLI
+
+@profiled_stage("content_extraction")
 def extract_website_content(url):
     """
     Extrait le contenu textuel d'un site web en utilisant l'API de conversion HTML vers Markdown
     Si l'API échoue, utilise des méthodes alternatives (trafilatura ou extraction directe)
     """
-    # Essayer d'abord avec l'API HTML vers Markdown
-    print("Tentative d'extraction avec l'API HTML vers Markdown...")
-    markdown_content = convert_html_to_markdown(url)
-    
-    if markdown_content:
-        print("Extraction réussie via l'API HTML vers Markdown")
-        return markdown_content
-    
-    # Si l'API échoue, essayer avec trafilatura
-    print("L'API a échoué, tentative avec trafilatura...")
+    # Essayer d'abord avec l'API HTML vers Markdown, sauf si son disjoncteur est ouvert
+    if markdown_api_available():
+        print("Tentative d'extraction avec l'API HTML vers Markdown...")
+        markdown_content = convert_html_to_markdown(url)
+        
+        if markdown_content:
+            print("Extraction réussie via l'API HTML vers Markdown")
+            return markdown_content
+        
+        # Si l'API échoue, essayer avec trafilatura
+        print("L'API a échoué, tentative avec trafilatura...")
+    else:
+        print("API HTML vers Markdown indisponible, extraction locale avec trafilatura...")
     try:
-        downloaded = trafilatura.fetch_url(url)
+        import trafilatura
+
+        # Téléchargement via la couche d'enregistrement/rejeu plutôt que trafilatura.fetch_url
+        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+        response = http_get(url, headers=headers, timeout=20)
+        downloaded = response.text if response.status_code == 200 else None
         if downloaded:
             text = trafilatura.extract(downloaded, include_comments=False, include_tables=False)
             if text:
@@ -39,11 +50,14 @@ def extract_fallback(url):
     Méthode de secours pour extraire le contenu d'un site web si les autres méthodes échouent
     """
     print("Utilisation de la méthode de secours pour l'extraction...")
+    soup = None
     try:
+        from bs4 import BeautifulSoup
+
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=20)
+        response = http_get(url, headers=headers, timeout=20)
         response.raise_for_status()
         
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -64,20 +78,15 @@ def extract_fallback(url):
     except Exception as e:
         print(f"Erreur lors de l'extraction fallback: {e}")
         return f"Échec de l'extraction du contenu de {url}: {str(e)}"
+    finally:
+        if soup is not None:
+            soup.decompose()
 
-def analyze_website_for_business_axes(url):
+def build_business_axes_request(content):
     """
-    Analyse un site web pour identifier les 4 axes principaux d'activité
-    en utilisant Azure OpenAI
+    Construit les paramètres de la complétion qui identifie les 4 axes d'activité à partir du contenu d'un site
+    Utilisé tel quel en temps réel et comme corps des requêtes en lot (batch_analyzer.py)
     """
-    # Extraire le contenu du site
-    content = extract_website_content(url)
-    
-    if not content or len(content) < 100:
-        return ["Échec de l'extraction du contenu suffisant"]
-    
-    # Initialiser le client Azure OpenAI
-    client = init_azure_openai()
     deployment_info = get_deployment_info()
     
     # Préparer la requête pour l'analyse des axes d'activité
@@ -89,23 +98,44 @@ def analyze_website_for_business_axes(url):
     {content[:10000]}  # Limiter à 10 000 caractères pour éviter les dépassements de tokens
     """
     
+    return {
+        'model': deployment_info["gpt_deployment"],
+        'messages': [
+            {"role": "system", "content": "Tu es un expert en analyse d'entreprise qui identifie les axes d'activité principaux d'une entreprise à partir du contenu Markdown de son site web."},
+            {"role": "user", "content": prompt}
+        ],
+        'max_tokens': 300,
+        'temperature': 0.3
+    }
+
+def parse_business_axes(axes_text):
+    """
+    Extrait les axes d'activité (4 au plus) de la réponse du modèle
+    """
+    axes_text = axes_text.strip()
+    axes = [line.strip() for line in axes_text.split('\n') if line.strip()]
+    
+    # Limiter à 4 axes
+    return axes[:4]
+
+def analyze_website_for_business_axes(url):
+    """
+    Analyse un site web pour identifier les 4 axes principaux d'activité
+    en utilisant Azure OpenAI
+    """
+    # Extraire le contenu du site
+    content = extract_website_content(url)
+    
+    if not content or len(content) < 100:
+        return ["Échec de l'extraction du contenu suffisant"]
+    
     try:
-        response = client.chat.completions.create(
-            model=deployment_info["gpt_deployment"],
-            messages=[
-                {"role": "system", "content": "Tu es un expert en analyse d'entreprise qui identifie les axes d'activité principaux d'une entreprise à partir du contenu Markdown de son site web."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=300,
-            temperature=0.3
-        )
+        # Le client Azure OpenAI n'est initialisé que si l'appel n'est pas rejoué depuis une cassette
+        with profile_stage("llm"):
+            axes_text = chat_completion(init_azure_openai, **build_business_axes_request(content))
         
         # Extraire et nettoyer les axes d'activité
-        axes_text = response.choices[0].message.content.strip()
-        axes = [line.strip() for line in axes_text.split('\n') if line.strip()]
-        
-        # Limiter à 4 axes
-        return axes[:4]
+        return parse_business_axes(axes_text)
     except Exception as e:
         print(f"Erreur lors de l'analyse des axes d'activité: {e}")
         return [f"Erreur d'analyse: {str(e)}"]